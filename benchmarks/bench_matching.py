@@ -0,0 +1,251 @@
+import os
+import gc
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+
+import numpy as np
+
+from synthetic import WEB_APP_DIR, TABLES, synthetic_table, write_csv
+
+
+# Stages of the search measured by the benchmark (in the order of the request's processing)
+STAGES = ['load', 'clean', 'index', 'display', 'candidates', 'distance', 'match', 'parallel', 'sort', 'render', 'export']
+
+
+## Function for the required skills of the search (n skills spread over the skills map, levels cycled incl. no level)
+def requested_skills(skills_map, n_skills):
+
+    skills = list(skills_map.values())[:-2]
+    step = max(len(skills) // n_skills, 1)
+    levels = ['junior', 'medior', 'senior', 'mentor', '']
+
+    return {skill: {'level': levels[i % len(levels)], 'weight': 1.0 + (i % 3) / 2}
+            for i, skill in enumerate(skills[::step][:n_skills])}
+
+
+## Function for the size of the skills index's arrays in bytes
+def index_bytes(skill_index):
+
+    return (skill_index.bits.nbytes + skill_index.levels.nbytes + skill_index.labels.nbytes + skill_index.similarity.nbytes
+            + sum(postings.nbytes for postings in skill_index.postings))
+
+
+## Function for rendering the whole result page of the search (the streamed page joined into one string)
+def render_page(app, search):
+
+    with app.app.test_request_context():
+        return ''.join(app.result_page_stream(search, 'benchmark', '', app.config))
+
+
+## Function for running the stage repeatedly (wall times in seconds) and once more with memory tracing (peak bytes)
+def measure(stage, repeat, trace_memory):
+
+    times = []
+
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = stage()
+        times.append(time.perf_counter() - start)
+
+    peak = None
+
+    if trace_memory:
+        gc.collect()
+        tracemalloc.start()
+        stage()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return result, times, peak
+
+
+## Function for the summary of the stage's measurements
+def summary(times, peak):
+
+    return {'p50_ms': float(np.percentile(times, 50)) * 1000,
+            'p95_ms': float(np.percentile(times, 95)) * 1000,
+            'max_ms': max(times) * 1000,
+            'peak_mb': None if peak is None else peak / 2 ** 20}
+
+
+## Function for benchmarking all the stages of one table size and all the numbers of the required skills
+def bench_size(app, n_rows, skills_counts, looking_for, args):
+
+    config, skills_map = app.config, app.config.skills_map
+
+    # Synthetic table written once per size (reused by the next runs)
+    data_dir = os.path.join(args.data_dir, f'rows_{n_rows}')
+    table_name = TABLES[looking_for]
+
+    if not os.path.exists(os.path.join(data_dir, f'{table_name}.csv')):
+        write_csv({table_name: synthetic_table(n_rows, looking_for, config, skills_map, seed = args.seed)}, data_dir)
+
+    from snapshot import CSVSource, clean_snapshot
+    from skill_index import MatchedSkills
+    from matcher import top_k, parallel_matching
+    from export import formatted_chunks, csv_stream, excel_stream
+
+    source = CSVSource(data_dir)
+    results = []
+
+    def record(stage, n_skills, times, peak):
+        results.append(dict(rows = n_rows, skills = n_skills, stage = stage, **summary(times, peak)))
+
+    # Stages which do not depend on the search (once per snapshot)
+    raw_df, times, peak = measure(lambda: source.read_table(table_name, config.required_columns),
+                                  args.repeat, args.memory)
+    record('load', None, times, peak)
+
+    processed_df, times, peak = measure(lambda: clean_snapshot(raw_df, skills_map, config), args.repeat, args.memory)
+    record('clean', None, times, peak)
+
+    skill_index, times, peak = measure(lambda: app.build_skill_index(processed_df, config), args.repeat, args.memory)
+    record('index', None, times, peak)
+
+    display, times, peak = measure(lambda: app.build_display(processed_df, config), args.repeat, args.memory)
+    record('display', None, times, peak)
+
+    # Only the skills index and the display store are kept with the snapshot (as in the app)
+    del raw_df, processed_df
+    print(f'  {n_rows} rows: skills index {index_bytes(skill_index) / 2 ** 20:.1f} MB, '
+          f'display store {display.__sizeof__() / 2 ** 20:.1f} MB', file = sys.stderr)
+
+    # Skills index saved once for the workers of the parallel scoring (as the on-disk snapshot)
+    index_dir = None
+    if args.workers:
+        index_dir = tempfile.mkdtemp(prefix = 'bench-index-')
+        skill_index.save(index_dir)
+
+    # Stages of the search
+    for n_skills in skills_counts:
+        skills_input = requested_skills(skills_map, n_skills)
+        matcher = app.make_matcher(skills_input, looking_for.capitalize(), config)
+
+        # Candidates with at least one of the required skills (i.e., non-zero cosine score)
+        rows, times, peak = measure(lambda: skill_index.candidates(skills_input), args.repeat, args.memory)
+        record('candidates', n_skills, times, peak)
+
+        _, times, peak = measure(lambda: matcher.level_scores(skill_index, rows), args.repeat, args.memory)
+        record('distance', n_skills, times, peak)
+
+        def match():
+            rows, scores = matcher.match(skill_index)
+            return rows, app.ranking_table(display, rows, scores, looking_for, config)
+
+        (rows, matches), times, peak = measure(match, args.repeat, args.memory)
+        record('match', n_skills, times, peak)
+
+        # Scoring on the process pool (chunks of the matched rows), its scores must be identical to the single-process scoring
+        if args.workers:
+            chunk_rows = max(len(rows) // args.workers, 1)
+            parallel, times, peak = measure(lambda: parallel_matching([matcher], skill_index, args.workers, chunk_rows,
+                                                                      index_dir = index_dir)[0],
+                                            args.repeat, args.memory)
+            record('parallel', n_skills, times, peak)
+
+            if not (np.array_equal(parallel[0], rows) and np.array_equal(parallel[1], matches[config['out_cols']['default'][-1]])):
+                print(f'  WARNING: parallel scores differ from the single-process scores', file = sys.stderr)
+
+        matched_display = display.subset(rows)
+        search = {'matches': matches, 'display': matched_display, 'skills': MatchedSkills(skill_index, rows, skills_input.keys()),
+                  'skills_input': skills_input, 'looking_for': looking_for.capitalize(),
+                  'integer_cols': matched_display.integer_columns(config['out_cols'][looking_for])}
+        sort_cols = app.sort_columns(search['looking_for'], config)
+
+        # Ranking of all the matches (cached with the matches by the app, the pages and exports are sliced from it)
+        search['matches'], times, peak = measure(lambda: top_k(matches, *sort_cols), args.repeat, args.memory)
+        record('sort', n_skills, times, peak)
+
+        _, times, peak = measure(lambda: render_page(app, search), args.repeat, args.memory)
+        record('render', n_skills, times, peak)
+
+        def export():
+            chunks = formatted_chunks(search['matches'],
+                                      lambda chunk: app.format_result(app.shown_rows(chunk, search, config),
+                                                                      skills_input, search['looking_for'],
+                                                                      search['integer_cols'], config),
+                                      config['export']['chunk_rows'])
+            if args.export == 'xlsx':
+                stream, _ = excel_stream(chunks, 'SkillsMatching', config['export']['spool_max_bytes'])
+            else:
+                stream = csv_stream(chunks)
+            return sum(len(data) for data in stream)
+
+        _, times, peak = measure(export, args.repeat, args.memory)
+        record('export', n_skills, times, peak)
+
+        print(f'  {n_rows} rows, {n_skills} skills: {len(matches)} matches', file = sys.stderr)
+
+    if index_dir is not None:
+        shutil.rmtree(index_dir, ignore_errors = True)
+
+    return results
+
+
+## Function for printing the results (with the ratio of the medians to the baseline's medians if given)
+def report(results, baseline = None):
+
+    baseline = {(r['rows'], r['skills'], r['stage']): r for r in baseline or []}
+
+    header = f'{"rows":>9} {"skills":>6} {"stage":<9} {"p50 [ms]":>10} {"p95 [ms]":>10} {"max [ms]":>10} {"peak [MB]":>10}'
+    print(header + (f' {"vs. base":>9}' if baseline else ''))
+
+    for r in results:
+        line = (f'{r["rows"]:>9} {r["skills"] if r["skills"] is not None else "-":>6} {r["stage"]:<9} '
+                f'{r["p50_ms"]:>10.2f} {r["p95_ms"]:>10.2f} {r["max_ms"]:>10.2f} '
+                f'{r["peak_mb"] if r["peak_mb"] is not None else float("nan"):>10.1f}')
+
+        base = baseline.get((r['rows'], r['skills'], r['stage']))
+        if base:
+            line += f' {r["p50_ms"] / base["p50_ms"]:>8.2f}x'
+
+        print(line)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description = 'Latency percentiles and peak memory of the search stages on synthetic tables')
+    parser.add_argument('--rows', type = int, nargs = '+', default = [1000, 10000, 100000],
+                        help = 'table sizes (e.g., 1000 10000 100000 1000000)')
+    parser.add_argument('--skills', type = int, nargs = '+', default = [1, 3, 10], help = 'numbers of the required skills')
+    parser.add_argument('--looking-for', choices = list(TABLES), default = 'volunteer')
+    parser.add_argument('--repeat', type = int, default = 5, help = 'number of timed runs of each stage')
+    parser.add_argument('--no-memory', dest = 'memory', action = 'store_false', help = 'skip the traced run (peak memory)')
+    parser.add_argument('--export', choices = ['csv', 'xlsx'], default = 'csv')
+    parser.add_argument('--workers', type = int, default = 0, help = 'number of processes of the parallel scoring stage (0 -> skipped)')
+    parser.add_argument('--data-dir', default = os.path.join('/tmp', 'skill-matcher-bench'), help = 'directory of the synthetic tables')
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--save', help = 'save the results as JSON (e.g., as a baseline)')
+    parser.add_argument('--baseline', help = 'JSON results of the baseline to compare with')
+    args = parser.parse_args()
+
+    # The app is imported from its directory with the synthetic tables as the data source
+    os.environ['data_source'] = f'csv:///{args.data_dir}'
+    os.chdir(WEB_APP_DIR)
+    sys.path.insert(0, WEB_APP_DIR)
+    import app
+
+    results = []
+    for n_rows in args.rows:
+        results += bench_size(app, n_rows, args.skills, args.looking_for, args)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding = 'utf-8') as f:
+            baseline = json.load(f)
+
+    report(results, baseline)
+
+    if args.save:
+        with open(args.save, 'w', encoding = 'utf-8') as f:
+            json.dump(results, f, indent = 2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+
+# Directory of the web application (the modules are imported from there, as on Lambda)
+WEB_APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'web_app')
+
+# Heavy packages which must not be imported at the app's start (they are imported lazily by the scoring routes)
+HEAVY_PACKAGES = ['pandas', 'numpy', 'scipy', 'sklearn', 'sqlalchemy', 'snowflake', 'pyarrow', 'xlsxwriter']
+
+# Cold-start scenarios: name -> Python code run in a fresh interpreter
+SCENARIOS = {
+    'import app': 'import app',
+    'login page': "import app; app.app.test_client().get('/')",
+    'scoring stack': 'import app, matcher, skill_index',
+}
+
+
+## Function for running the code in a fresh interpreter with the import time tracing
+ # Returns the wall time in seconds and the parsed import times (module, self time [us], cumulative time [us], depth)
+def run_cold(code):
+
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE = '1')
+
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd = WEB_APP_DIR, env = env,
+                             capture_output = True, text = True)
+    wall = time.perf_counter() - start
+
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr[-2000:])
+
+    imports = []
+
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+
+        imports.append((name.strip(), int(self_us), int(cumulative_us), depth))
+
+    return wall, imports
+
+
+## Function for the import times of the top-level packages (sum of the self times of all their modules)
+def package_times(imports):
+
+    packages = {}
+
+    for name, self_us, _, _ in imports:
+        package = name.split('.')[0]
+        packages[package] = packages.get(package, 0) + self_us
+
+    return sorted(packages.items(), key = lambda item: -item[1])
+
+
+## Function for printing the report of one scenario
+def report(scenario, wall, imports, top):
+
+    print(f'\n== {scenario}: {wall * 1000:.0f} ms wall, '
+          f'{sum(self_us for _, self_us, _, _ in imports) / 1000:.0f} ms importing {len(imports)} modules')
+
+    print(f'{"package":<30}{"self [ms]":>12}')
+    for package, self_us in package_times(imports)[:top]:
+        print(f'{package:<30}{self_us / 1000:>12.1f}')
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description = 'Cold-start import time of the web application per module')
+    parser.add_argument('--top', type = int, default = 15, help = 'number of the slowest packages reported')
+    parser.add_argument('--repeat', type = int, default = 3, help = 'number of cold runs (the fastest one is reported)')
+    parser.add_argument('--max-ms', type = float, default = None, help = "fail if 'import app' takes longer")
+    args = parser.parse_args()
+
+    failed = False
+
+    for scenario, code in SCENARIOS.items():
+        wall, imports = min((run_cold(code) for _ in range(args.repeat)), key = lambda run: run[0])
+        report(scenario, wall, imports, args.top)
+
+        if scenario == 'import app':
+            # Heavy packages imported at the app's start are a regression of the lazy imports
+            heavy = sorted({name.split('.')[0] for name, _, _, _ in imports} & set(HEAVY_PACKAGES))
+            if heavy:
+                print(f'\nFAIL: heavy packages imported at the app start: {", ".join(heavy)}')
+                failed = True
+
+            if args.max_ms is not None and wall * 1000 > args.max_ms:
+                print(f'\nFAIL: import app took {wall * 1000:.0f} ms (limit {args.max_ms:.0f} ms)')
+                failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,368 @@
+import os
+import io
+import re
+import sys
+import csv
+import json
+import time
+import html
+import socket
+import argparse
+import subprocess
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from synthetic import WEB_APP_DIR, TABLES, read_inputs, synthetic_table, write_sqlite
+
+
+# Worker process of the app (Werkzeug's threaded server, i.e., one process serving the concurrent requests by threads)
+SERVER = '''
+import sys
+from werkzeug.serving import make_server
+import app
+make_server(sys.argv[1], int(sys.argv[2]), app.app, threaded = True).serve_forever()
+'''
+
+# Steps of the recruiter's session (in their order)
+STEPS = ['login', 'result', 'download', 'prep_email']
+
+# Credentials of the app during the load test
+CREDENTIALS = {'username': 'loadtest', 'password': 'loadtest'}
+
+
+## Function for a free local port
+def free_port():
+
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+## Function for starting the app's worker processes against the local data source (each worker on its own port)
+ # Returns the processes, their base URLs and the paths of their logs (incl. the structured log lines of the requests)
+def start_workers(n_workers, env, log_dir, timeout = 120):
+
+    workers = []
+
+    for i in range(n_workers):
+        port = free_port()
+        log_path = os.path.join(log_dir, f'worker_{i}.log')
+        process = subprocess.Popen([sys.executable, '-c', SERVER, '127.0.0.1', str(port)], cwd = WEB_APP_DIR, env = env,
+                                   stdout = open(log_path, 'w'), stderr = subprocess.STDOUT)
+        workers.append((process, f'http://127.0.0.1:{port}', log_path))
+
+    # Waiting for the login page of each worker
+    deadline = time.time() + timeout
+    for process, url, log_path in workers:
+        while http('GET', url + '/', timeout = 5)[0] != 200:
+            if process.poll() is not None or time.time() > deadline:
+                stop_workers(workers)
+                with open(log_path, 'r', encoding = 'utf-8') as f:
+                    raise RuntimeError(f'The worker {url} did not start:\n{f.read()[-2000:]}')
+            time.sleep(0.2)
+
+    return workers
+
+
+## Function for stopping the worker processes
+def stop_workers(workers):
+
+    for process, _, _ in workers:
+        process.terminate()
+    for process, _, _ in workers:
+        process.wait()
+
+
+# Redirects are not followed (the session's steps are measured one by one)
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+opener = urllib.request.build_opener(NoRedirect)
+
+
+## Function for the HTTP request - returns its status (None if it failed), body and latency in seconds
+def http(method, url, form = None, json_body = None, timeout = 60):
+
+    data, headers = None, {}
+
+    if form is not None:
+        data = urllib.parse.urlencode(form).encode('utf-8')
+        headers['Content-Type'] = 'application/x-www-form-urlencoded'
+    elif json_body is not None:
+        data = json.dumps(json_body).encode('utf-8')
+        headers['Content-Type'] = 'application/json'
+
+    start = time.perf_counter()
+
+    try:
+        with opener.open(urllib.request.Request(url, data = data, headers = headers, method = method), timeout = timeout) as response:
+            return response.status, response.read(), time.perf_counter() - start
+    except urllib.error.HTTPError as e:
+        return e.code, e.read(), time.perf_counter() - start
+    except (urllib.error.URLError, OSError):
+        return None, b'', time.perf_counter() - start
+
+
+## Function for the searches of the sessions (random skills with levels and weights, as filled in the form)
+ # The sessions reuse the searches, so the same search is submitted concurrently by several sessions
+def session_searches(n_searches, skills_map, looking_for, seed):
+
+    rng = np.random.default_rng(seed)
+    names = list(skills_map)[:-2]
+    searches = []
+
+    for _ in range(n_searches):
+        skills = rng.choice(names, rng.integers(1, 5), replace = False)
+        form = {'looking-for': looking_for.capitalize(), 'position_link0': '', 'position_description0': ''}
+
+        for i, skill in enumerate(skills):
+            form[f'option_skill{i}'] = skill
+            form[f'level_skill{i}'] = rng.choice(['', 'Junior', 'Medior', 'Senior', 'Mentor'])
+            form[f'skill_weight{i}'] = rng.choice(['', '1', '2'])
+
+        searches.append((list(skills), form))
+
+    return searches
+
+
+## Function for the header and rows (cells' texts) of the result page's table
+def page_table(page):
+
+    header = [html.unescape(col) for col in re.findall(r'<th>(.*?)</th>', page, re.S)]
+    rows = [[html.unescape(re.sub(r'<[^>]+>', '', cell)).strip() for cell in re.findall(r'<td>(.*?)</td>', row, re.S)]
+            for row in re.findall(r'<tr>(.*?)</tr>', page.split('<tbody>', 1)[-1], re.S)]
+
+    return header, rows
+
+
+## Function for running one recruiter's session: login -> result -> download -> prep_email
+ # Each response is checked against the session's own search (its skills, position name and selected emails),
+ # any response belonging to another session is reported as a leak
+def run_session(base_url, session_id, skills, form, config, export_format, timeout):
+
+    steps, leaks = {}, []
+    position_name = f'Load test {session_id}'
+    form = dict(form, position_name0 = position_name)
+
+    def leak(step, message):
+        leaks.append({'session': session_id, 'step': step, 'message': message})
+
+    # Login (redirected to the form)
+    status, _, seconds = http('POST', base_url + '/login', form = CREDENTIALS, timeout = timeout)
+    steps['login'] = (status, seconds, status == 302)
+
+    # Search - the first page of the result table
+    status, body, seconds = http('POST', base_url + '/result', form = form, timeout = timeout)
+    page = body.decode('utf-8', errors = 'replace')
+    search_id = re.search(r'data-search-id="([^"]+)"', page)
+    steps['result'] = (status, seconds, status == 200 and search_id is not None)
+
+    if not steps['result'][2]:
+        return {'steps': steps, 'leaks': leaks}
+
+    search_id = search_id.group(1)
+    total = int(re.search(r'data-total="(\d+)"', page).group(1))
+    header, rows = page_table(page)
+    emails = [row[header.index(config['email'])] for row in rows if len(row) == len(header)]
+
+    if not set(skills) <= set(header):
+        leak('result', f'skills {skills} not in the columns {header}')
+
+    # Download of the whole result table
+    status, body, seconds = http('GET', f'{base_url}/download?search_id={search_id}&format={export_format}', timeout = timeout)
+    steps['download'] = (status, seconds, status == 200)
+
+    if status == 200 and export_format == 'csv':
+        table = list(csv.reader(io.StringIO(body.decode('utf-8-sig'))))
+
+        if not set(skills) <= set(table[0]):
+            leak('download', f'skills {skills} not in the columns {table[0]}')
+        if len(table) - 1 != total:
+            leak('download', f'{len(table) - 1} rows instead of {total}')
+        if [row[table[0].index(config['email'])] for row in table[1:len(emails) + 1]] != emails:
+            leak('download', 'the first rows differ from the result page')
+
+    # Email to the first matched volunteers / mentors of the page
+    selected = emails[:3]
+    status, body, seconds = http('POST', f'{base_url}/prep_email?search_id={search_id}',
+                                 json_body = [{'Name': '', 'Email': email} for email in selected], timeout = timeout)
+    steps['prep_email'] = (status, seconds, status == 200)
+
+    if status == 200:
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(json.loads(body)['url']).query)
+
+        if query.get('bcc', [''])[0] != ','.join(selected):
+            leak('prep_email', f'Bcc {query.get("bcc")} instead of {selected}')
+        if position_name not in query.get('su', [''])[0]:
+            leak('prep_email', f'subject {query.get("su")} of another position')
+
+    return {'steps': steps, 'leaks': leaks, 'search': tuple(skills), 'total': total, 'emails': emails}
+
+
+## Function for the sessions' results of the same search which differ from each other (e.g., the result of another session)
+def inconsistent_searches(sessions):
+
+    seen, leaks = {}, []
+
+    for session in sessions:
+        if 'search' not in session:
+            continue
+
+        result = (session['total'], session['emails'])
+        first = seen.setdefault((session['search'], session['form_id']), result)
+
+        if result != first:
+            leaks.append({'session': None, 'step': 'result', 'message': f'different results of the same search {session["search"]}'})
+
+    return leaks
+
+
+## Function for the peak memory (MB) and the number of the requests of each worker from its structured log lines
+def worker_memory(workers):
+
+    memory = []
+
+    for i, (_, url, log_path) in enumerate(workers):
+        peak, requests = None, 0
+
+        with open(log_path, 'r', encoding = 'utf-8', errors = 'replace') as f:
+            for line in f:
+                line = line[line.find('{'):]
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+
+                if event.get('event') == 'request':
+                    requests += 1
+                    if event.get('max_rss_mb') is not None:
+                        peak = max(peak or 0, event['max_rss_mb'])
+
+        memory.append({'worker': i, 'url': url, 'requests': requests, 'peak_rss_mb': peak})
+
+    return memory
+
+
+## Function for running the sessions at given concurrency (the sessions are spread over the workers round-robin)
+def run_level(workers, searches, concurrency, n_sessions, config, args):
+
+    with ThreadPoolExecutor(max_workers = concurrency) as pool:
+        start = time.perf_counter()
+        futures = []
+
+        for i in range(n_sessions):
+            form_id = i % len(searches)
+            skills, form = searches[form_id]
+            futures.append((form_id, pool.submit(run_session, workers[i % len(workers)][1], f'{concurrency}-{i}', skills, form,
+                                                 config, args.export_format, args.timeout)))
+
+        sessions = [dict(future.result(), form_id = form_id) for form_id, future in futures]
+        wall = time.perf_counter() - start
+
+    result = {'concurrency': concurrency, 'sessions': n_sessions, 'seconds': wall,
+              'sessions_per_s': n_sessions / wall,
+              'requests_per_s': sum(len(session['steps']) for session in sessions) / wall,
+              'steps': {},
+              'leaks': [leak for session in sessions for leak in session['leaks']] + inconsistent_searches(sessions)}
+
+    for step in STEPS:
+        measured = [session['steps'][step] for session in sessions if step in session['steps']]
+        if not measured:
+            continue
+
+        latencies = np.array([seconds for _, seconds, _ in measured]) * 1000
+        result['steps'][step] = {'requests': len(measured),
+                                 'errors': sum(not ok for _, _, ok in measured),
+                                 'over_limit': int((latencies > args.limit * 1000).sum()),
+                                 'p50_ms': float(np.percentile(latencies, 50)),
+                                 'p90_ms': float(np.percentile(latencies, 90)),
+                                 'p99_ms': float(np.percentile(latencies, 99)),
+                                 'max_ms': float(latencies.max())}
+
+    return result
+
+
+## Function for printing the results of the concurrency levels
+def report(results, memory, limit):
+
+    print(f'{"conc.":>5} {"step":<10} {"reqs":>6} {"errors":>7} {f">{limit:g}s":>6} {"p50 [ms]":>9} {"p90 [ms]":>9} '
+          f'{"p99 [ms]":>9} {"max [ms]":>9}')
+
+    for r in results:
+        for step, s in r['steps'].items():
+            print(f'{r["concurrency"]:>5} {step:<10} {s["requests"]:>6} {s["errors"] / s["requests"]:>7.1%} {s["over_limit"]:>6} '
+                  f'{s["p50_ms"]:>9.1f} {s["p90_ms"]:>9.1f} {s["p99_ms"]:>9.1f} {s["max_ms"]:>9.1f}')
+
+        print(f'{r["concurrency"]:>5} {"total":<10} {r["sessions"]} sessions in {r["seconds"]:.1f} s: '
+              f'{r["sessions_per_s"]:.2f} sessions/s, {r["requests_per_s"]:.1f} requests/s, {len(r["leaks"])} leaks')
+
+        for leak in r['leaks'][:5]:
+            print(f'      LEAK {leak}')
+
+    for worker in memory:
+        print(f'worker {worker["worker"]} ({worker["url"]}): {worker["requests"]} requests, '
+              f'peak RSS {worker["peak_rss_mb"] or 0:.1f} MB')
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description = 'Concurrent recruiters\' sessions (login -> result -> download -> prep_email) '
+                                                   'against the app on a local SQLite stand-in of the Snowflake tables')
+    parser.add_argument('--rows', type = int, default = 10000, help = 'number of rows of the synthetic tables')
+    parser.add_argument('--concurrency', type = int, nargs = '+', default = [1, 4, 16], help = 'numbers of the concurrent sessions')
+    parser.add_argument('--sessions', type = int, default = 50, help = 'number of the sessions per concurrency level')
+    parser.add_argument('--workers', type = int, default = 1, help = 'number of the app\'s worker processes')
+    parser.add_argument('--searches', type = int, default = 10, help = 'number of the distinct searches of the sessions')
+    parser.add_argument('--looking-for', choices = list(TABLES), default = 'volunteer')
+    parser.add_argument('--export-format', choices = ['csv', 'xlsx'], default = 'csv', help = 'format of the downloads (the leaks are checked in CSV only)')
+    parser.add_argument('--timeout', type = float, default = 60, help = 'client timeout of the requests in seconds')
+    parser.add_argument('--limit', type = float, default = 30, help = 'latency limit in seconds (the timeout in serverless.yml)')
+    parser.add_argument('--data-dir', default = os.path.join('/tmp', 'skill-matcher-load'), help = 'directory of the synthetic tables and the workers\' logs')
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--save', help = 'save the results as JSON')
+    args = parser.parse_args()
+
+    config, skills_map = read_inputs()
+
+    # Local stand-in of the Snowflake tables
+    os.makedirs(args.data_dir, exist_ok = True)
+    db_path = os.path.join(args.data_dir, f'tables_{args.rows}.sqlite')
+    if not os.path.exists(db_path):
+        write_sqlite({table_name: synthetic_table(args.rows, looking_for, config, skills_map, seed = args.seed + i)
+                      for i, (looking_for, table_name) in enumerate(TABLES.items())}, db_path)
+
+    env = dict(os.environ, data_source = f'sqlite:///{db_path}', app_username = CREDENTIALS['username'],
+               app_password = CREDENTIALS['password'], snowflake_volunteer = TABLES['volunteer'], snowflake_mentor = TABLES['mentor'])
+
+    workers = start_workers(args.workers, env, args.data_dir)
+    searches = session_searches(args.searches, skills_map, args.looking_for, args.seed)
+
+    try:
+        # Warm-up of each worker (snapshot loaded), not measured
+        for _, url, _ in workers:
+            run_session(url, 'warmup', *searches[0], config, args.export_format, args.timeout)
+
+        results = [run_level(workers, searches, concurrency, args.sessions, config, args) for concurrency in args.concurrency]
+    finally:
+        stop_workers(workers)
+
+    memory = worker_memory(workers)
+    report(results, memory, args.limit)
+
+    if args.save:
+        with open(args.save, 'w', encoding = 'utf-8') as f:
+            json.dump({'levels': results, 'workers': memory}, f, indent = 2)
+
+    # Failing if any data leaked between the sessions
+    if any(r['leaks'] for r in results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+import os
+import sys
+import json
+import sqlite3
+import argparse
+
+import yaml
+import numpy as np
+import pandas as pd
+
+
+# Directory of the web application (configuration and skills map)
+WEB_APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'web_app')
+
+# Default names of the volunteers' / mentors' tables (as in the 'snowflake_volunteer' / 'snowflake_mentor' environment variables)
+TABLES = {'volunteer': os.getenv('snowflake_volunteer', 'volunteers'),
+          'mentor': os.getenv('snowflake_mentor', 'mentors')}
+
+# Skills' levels as stored in Snowflake (empty string is a missing level)
+LEVELS = ['junior', 'medior', 'senior', 'mentor', '']
+
+
+## Function for reading the app's configuration and skills map
+def read_inputs():
+
+    with open(os.path.join(WEB_APP_DIR, 'inputs', 'config.yaml'), 'r', encoding = 'utf-8') as f:
+        config = yaml.safe_load(f)
+
+    with open(os.path.join(WEB_APP_DIR, config['input_dir'], config['skills_map']), 'r', encoding = 'utf-8') as f:
+        skills_map = json.load(f)
+
+    return config, skills_map
+
+
+## Function for the name of the skill level column including Keboola's quirks (extra underscores for some of the skills)
+def level_column(skill, i):
+
+    if i % 7 == 3:
+        return f'{skill}__level'
+    elif i % 11 == 5:
+        return f'{skill}____level'
+    else:
+        return f'{skill}_level'
+
+
+## Function for generating the volunteers' / mentors' table shaped as the one pulled from Snowflake
+ # All the values are strings: skills' indicators '0'/'1', skill levels (empty if missing), output columns, 'InternalTeam' and '_timestamp'
+ # A few skills of the skills map are left out of the table (as the skills which nobody has filled in yet)
+def synthetic_table(n_rows, looking_for, config, skills_map, skill_prob = 0.15, seed = 0,
+                    timestamp = '2023-06-01 10:00:00'):
+
+    rng = np.random.default_rng(seed)
+    ids = np.arange(n_rows).astype(str).astype(object)
+
+    table = {'Name': 'User ' + ids,
+             'Email': 'user' + ids + '@example.com',
+             config['drop_rows']['col']: np.where(rng.random(n_rows) < 0.02, config['drop_rows']['val'], 'NO').astype(object),
+             config['timestamp']: np.full(n_rows, timestamp, dtype = object)}
+
+    # Output columns of the volunteers / mentors (strings as in Snowflake, incl. the missing values as empty strings)
+    for col in config['out_cols'][looking_for]:
+        if col == config['other_skills']:
+            continue
+        elif col == 'ProfileURL':
+            table[col] = 'https://www.cesko.digital/profile/' + ids
+        elif col == config['last_email_sent']:
+            table[col] = rng.choice(np.array(['2023-01-02', '2022-11-30', ''], dtype = object), n_rows)
+        elif col == 'OnProjectNow':
+            table[col] = rng.choice(np.array(list(config['on_project_now']['val']), dtype = object), n_rows)
+        elif col in ('DaysSinceRegistered', 'CountPastProjects'):
+            table[col] = rng.integers(0, 1000, n_rows).astype(float).astype(str).astype(object)
+            table[col][rng.random(n_rows) < 0.05] = ''
+        else:
+            table[col] = rng.choice(np.array(['Lorem ipsum dolor sit amet.', 'Consectetur adipiscing elit.', ''], dtype = object), n_rows)
+
+    # Skills' indicators and levels
+    for i, skill in enumerate(list(skills_map.values())[:-2]):
+        has_skill = rng.random(n_rows) < skill_prob
+
+        table[skill] = np.where(has_skill, '1', '0').astype(object)
+        table[level_column(skill, i)] = np.where(has_skill, rng.choice(np.array(LEVELS, dtype = object), n_rows), '')
+
+    return pd.DataFrame(table)
+
+
+## Function for writing the tables into the directory of CSV files (for the 'csv:///<directory>' data source)
+def write_csv(tables, directory):
+
+    os.makedirs(directory, exist_ok = True)
+
+    for table_name, table in tables.items():
+        table.to_csv(os.path.join(directory, f'{table_name}.csv'), index = False)
+
+
+## Function for writing the tables into the SQLite database (for the 'sqlite:///<path>' data source)
+def write_sqlite(tables, path):
+
+    with sqlite3.connect(path) as conn:
+        for table_name, table in tables.items():
+            table.to_sql(table_name, conn, if_exists = 'replace', index = False)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description = "Synthetic volunteers' / mentors' tables shaped as the ones in Snowflake")
+    parser.add_argument('--rows', type = int, default = 10000, help = 'number of rows of each table')
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--csv', help = 'directory of the CSV files (data_source=csv:///<directory>)')
+    parser.add_argument('--sqlite', help = 'path of the SQLite database (data_source=sqlite:///<path>)')
+    args = parser.parse_args()
+
+    if not args.csv and not args.sqlite:
+        parser.error('at least one of --csv / --sqlite is required')
+
+    config, skills_map = read_inputs()
+    tables = {table_name: synthetic_table(args.rows, looking_for, config, skills_map, seed = args.seed + i)
+              for i, (looking_for, table_name) in enumerate(TABLES.items())}
+
+    if args.csv:
+        write_csv(tables, args.csv)
+    if args.sqlite:
+        write_sqlite(tables, args.sqlite)
+
+    print(f'{len(tables)} tables x {args.rows} rows written '
+          f'(snowflake_volunteer={TABLES["volunteer"]}, snowflake_mentor={TABLES["mentor"]})', file = sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
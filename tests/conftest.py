@@ -0,0 +1,46 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'web_app'))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+# Local stand-in of the Snowflake tables (synthetic tables as CSV files), selected before the app is imported
+DATA_DIR = tempfile.mkdtemp(prefix = 'skill-matcher-tests-')
+os.environ.update(data_source = f'csv:///{DATA_DIR}', snowflake_volunteer = 'volunteers', snowflake_mentor = 'mentors',
+                  app_username = 'test', app_password = 'test')
+
+from synthetic import TABLES, read_inputs, synthetic_table, write_csv
+
+
+## Fixture of the app on the synthetic tables (snapshots kept in the process only, not shared with the other runs on disk)
+@pytest.fixture(scope = 'session')
+def app():
+
+    config, skills_map = read_inputs()
+    write_csv({table_name: synthetic_table(500, looking_for, config, skills_map, seed = i)
+               for i, (looking_for, table_name) in enumerate(TABLES.items())}, DATA_DIR)
+
+    import app
+
+    app.snapshot_cache.cache_dir = None
+
+    return app
+
+
+
+## Fixture of the result form of a search for given skills (the skills' names with diacritics)
+@pytest.fixture
+def search_form():
+
+    def form(*skills):
+        fields = {'looking-for': 'Volunteer', 'position_name0': 'Test', 'position_link0': '', 'position_description0': ''}
+        for i, skill in enumerate(skills):
+            fields[f'option_skill{i}'] = skill
+        return fields
+
+    return form
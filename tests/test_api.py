@@ -0,0 +1,48 @@
+import pytest
+
+
+## Invalid batch requests are rejected with 400 (not 500 or an empty result)
+@pytest.mark.parametrize('payload', [[], 'Volunteer', {'looking-for': None, 'positions': [{'option_skill0': 'Backend'}]},
+                                     {'looking-for': 'default', 'positions': [{'option_skill0': 'Backend'}]},
+                                     {'positions': []}, {'positions': None}, {'positions': {'option_skill0': 'Backend'}},
+                                     {'positions': [{'option_skill0': 'Backend'}, {}]}])
+def test_batch_invalid(app, payload):
+
+    response = app.app.test_client().post('/batch', json = payload)
+
+    assert response.status_code == 400
+
+
+## Valid batch request returns the matches of each position
+def test_batch(app):
+
+    response = app.app.test_client().post('/batch', json = {'top_k': 5, 'positions': [{'option_skill0': 'Backend'}]})
+
+    assert response.status_code == 200
+    assert len(response.get_json()['positions']) == 1
+
+
+## Invalid reverse requests are rejected with 400 (not 500)
+@pytest.mark.parametrize('payload', [[], None, {'looking-for': None, 'skills': [{'skill': 'Backend', 'level': 'senior'}]},
+                                     {'looking-for': 'default', 'skills': [{'skill': 'Backend', 'level': 'senior'}]}, {}])
+def test_reverse_invalid(app, payload):
+
+    response = app.app.test_client().post('/reverse', json = payload)
+
+    assert response.status_code == 400
+
+
+## Cached matches are ranked once, the same search is served the same ranked table (not sorted again)
+def test_ranked_matches(app):
+
+    from matcher import top_k
+
+    config = app.config_loader.get()
+    skills_input = app.parse_skills_input({'option_skill0': 'Backend', 'option_skill1': 'Frontend'}, config.skills_map)
+    snapshot = app.snapshot_cache.get('volunteers')
+    search = lambda: app.scored_matches(app.make_matcher(skills_input, 'Volunteer', config), skills_input, 'Volunteer', snapshot, config)
+
+    rows, ranking = search()
+
+    assert ranking.index.equals(top_k(ranking.sort_index(), *app.sort_columns('Volunteer', config)).index)
+    assert search()[1] is ranking
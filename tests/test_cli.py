@@ -0,0 +1,42 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+
+## Reverse matching of the volunteers not found in the snapshot writes the file with the columns only (no partial file left)
+@pytest.mark.parametrize('output_format', ['csv', 'parquet'])
+def test_reverse_unknown_emails(app, tmp_path, monkeypatch, output_format):
+
+    if not app.export_available(output_format):
+        pytest.skip(f'{output_format} output is not available')
+
+    import cli
+
+    positions = os.path.join(os.path.dirname(app.__file__), 'inputs', 'positions.yaml')
+    monkeypatch.setattr(sys, 'argv', ['cli.py', positions, '--output-dir', str(tmp_path), '--format', output_format,
+                                      '--reverse', 'nobody@example.com', 'noone@example.com'])
+    cli.main()
+
+    path = tmp_path / f'reverse.{output_format}'
+    reverse = pd.read_csv(path, encoding = 'utf-8-sig') if output_format == 'csv' else pd.read_parquet(path)
+
+    assert list(reverse.columns) == ['Email', 'Name', 'Rank', 'Position', 'Score']
+    assert len(reverse) == 0
+    assert os.listdir(tmp_path) == [f'reverse.{output_format}']
+
+
+## Failed stream leaves no temporary file behind
+def test_write_stream_failure(tmp_path):
+
+    import cli
+
+    def failing():
+        yield b'partial'
+        raise RuntimeError('failed')
+
+    with pytest.raises(RuntimeError):
+        cli.write_stream(failing(), str(tmp_path / 'out.csv'))
+
+    assert os.listdir(tmp_path) == []
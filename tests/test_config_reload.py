@@ -0,0 +1,79 @@
+import os
+import shutil
+
+import yaml
+import pytest
+
+
+## Fixture of the app whose configuration is reloaded from a copy of the input files (returns the app and the copied config.yaml)
+@pytest.fixture
+def reloaded_app(app, tmp_path, monkeypatch):
+
+    from compiled_config import ConfigLoader
+
+    shutil.copytree(os.path.join(os.path.dirname(app.__file__), 'inputs'), tmp_path / 'inputs')
+    config_path = tmp_path / 'inputs' / 'config.yaml'
+
+    monkeypatch.setattr(app, 'config_loader', ConfigLoader(str(config_path)))
+
+    return app, config_path
+
+
+## Function for changing the copied config.yaml (with a later modification time, so the change is noticed)
+def change_config(config_path, change):
+
+    with open(config_path, 'r', encoding = 'utf-8') as f:
+        config = yaml.safe_load(f)
+
+    change(config)
+
+    with open(config_path, 'w', encoding = 'utf-8') as f:
+        yaml.safe_dump(config, f, allow_unicode = True)
+
+    mtime = os.stat(config_path).st_mtime + 10
+    os.utime(config_path, (mtime, mtime))
+
+
+## New output column is not applied by the reload (the snapshots are built with the output columns), the searches still work
+def test_reload_new_output_column(reloaded_app, search_form):
+
+    app, config_path = reloaded_app
+    original = app.config_loader.get()
+
+    change_config(config_path, lambda config: config['out_cols']['volunteer'].append('InternalTeam'))
+
+    response = app.app.test_client().post('/result', data = search_form('Backend', 'Frontend'))
+
+    assert response.status_code == 200
+    assert app.config_loader.get() is original
+
+
+## Other changes are applied by the reload, e.g., the page size of the result table
+def test_reload_page_size(reloaded_app, search_form):
+
+    app, config_path = reloaded_app
+
+    change_config(config_path, lambda config: config.update(page_size = 3))
+
+    response = app.app.test_client().post('/result', data = search_form('Backend', 'Frontend'))
+
+    assert response.status_code == 200
+    assert app.config_loader.get()['page_size'] == 3
+    assert response.get_data(as_text = True).count('class="email-checkbox"') == 3
+
+
+## Open positions are indexed again with the reloaded level distances (the reverse matching's scores change)
+def test_reload_level_distance(reloaded_app):
+
+    app, config_path = reloaded_app
+    payload = {'skills': [{'skill': 'Backend', 'level': 'junior'}, {'skill': 'Frontend', 'level': 'senior'}], 'top_k': 100}
+
+    before = app.app.test_client().post('/reverse', json = payload).get_json()['positions']
+
+    change_config(config_path, lambda config: config['level_distance'].update(
+        {level: [dist * 3 if isinstance(dist, (int, float)) else dist for dist in dists]
+         for level, dists in config['level_distance'].items()}))
+
+    after = app.app.test_client().post('/reverse', json = payload).get_json()['positions']
+
+    assert [position['score'] for position in before] != [position['score'] for position in after]
@@ -0,0 +1,121 @@
+import os
+
+import numpy as np
+import pytest
+
+from compiled_config import read_config
+from matcher import SkillsMatcher, parallel_matching
+from skill_index import SkillIndex
+from snapshot import clean_snapshot
+from synthetic import WEB_APP_DIR, synthetic_table
+
+
+## Fixture of the compiled configuration and the cleaned synthetic table with its skills index
+ # A part of the volunteers' skills have missing levels (the 'N/A level' of the cleaned table)
+@pytest.fixture(scope = 'module')
+def table():
+
+    config = read_config(os.path.join(WEB_APP_DIR, 'inputs', 'config.yaml'))
+    processed_df = clean_snapshot(synthetic_table(300, 'volunteer', config, config.skills_map, skill_prob = 0.3, seed = 7),
+                                  config.skills_map, config)
+
+    rng = np.random.default_rng(7)
+    for skill in config.skills_map.values():
+        missing_level = (processed_df[skill] == 1).to_numpy() & (rng.random(len(processed_df)) < 0.1)
+        processed_df.loc[missing_level, f'{skill}_level'] = config['mapping_lvl_nan']['skill_y_lvl_n']
+
+    skill_index = SkillIndex(processed_df, config.skills_map,
+                             config['mapping_lvl_nan']['skill_y_lvl_n'], config['mapping_lvl_nan']['skill_n_lvl_n'])
+
+    return config, processed_df, skill_index
+
+
+## Function for the random searches (required skills with their levels and weights, incl. any level)
+def searches(config, n_searches, seed = 0):
+
+    rng = np.random.default_rng(seed)
+    skills = list(config.skills_map.values())[:-2]
+
+    for _ in range(n_searches):
+        yield {skill: {'level': str(rng.choice(['', 'junior', 'medior', 'senior', 'mentor'])), 'weight': float(rng.choice([1, 1, 2, 0.5]))}
+               for skill in rng.choice(skills, int(rng.integers(1, 5)), replace = False)}
+
+
+## Function for the matcher of the search with given scoring backend
+def make_matcher(config, skills_input, backend):
+
+    return SkillsMatcher(skills_input, config['out_cols']['default'], config.output_cols['volunteer'], config['X_const'],
+                         config['mapping_lvl_nan']['skill_y_lvl_n'], config['mapping_lvl_nan']['skill_n_lvl_n'],
+                         backend = backend, level_distance = config.level_distance)
+
+
+## Function for the baseline scoring of the search (the original matching on the whole cleaned table):
+ # cosine filtering of the volunteers having any of the skills and the average of the inverses of the average distances
+ # of the levels' matrix (Euclidean, Manhattan and Mahalanobis if its covariance matrix is not singular)
+def baseline_scores(config, processed_df, skills_input):
+
+    from scipy.spatial import distance
+    from sklearn.metrics.pairwise import cosine_similarity
+
+    skills = list(skills_input)
+    indicator = np.vstack((np.ones(len(skills)), processed_df[skills].to_numpy()))
+    rows = np.flatnonzero(cosine_similarity(indicator)[0, 1:] > 0)
+
+    codes = ['junior', 'medior', 'senior', 'mentor', config['mapping_lvl_nan']['skill_y_lvl_n'], config['mapping_lvl_nan']['skill_n_lvl_n']]
+    columns = []
+    for skill, props in skills_input.items():
+        distances = dict(zip(codes, config.level_distance[props['level'] or 'any']))
+        levels = [props['level'] or codes[4]] + list(processed_df[f'{skill}_level'].iloc[rows])
+        columns.append([props['weight'] * distances[level] for level in levels])
+    lvl_skills_matrix = np.array(columns, dtype = np.double).T
+
+    scores = []
+    for metric in ('euclidean', 'cityblock', 'mahalanobis'):
+        try:
+            scores.append(1 / (distance.squareform(distance.pdist(lvl_skills_matrix, metric = metric))[0, 1:] / len(skills) + 1))
+        except (np.linalg.LinAlgError, ValueError):
+            pass
+
+    return rows, np.round(np.mean(scores, axis = 0), 2)
+
+
+## Both backends match the same volunteers with the same scores (hence the same ranking) as the baseline scoring
+@pytest.mark.parametrize('backend', ['pairwise', 'vectorized'])
+def test_backends(table, backend):
+
+    config, processed_df, skill_index = table
+
+    for skills_input in searches(config, 20):
+        rows, scores = make_matcher(config, skills_input, backend).match(skill_index)
+        baseline_rows, baseline = baseline_scores(config, processed_df, skills_input)
+
+        np.testing.assert_array_equal(rows, baseline_rows)
+        np.testing.assert_allclose(scores, baseline, rtol = 0, atol = 1e-9)
+        np.testing.assert_array_equal(rows[np.argsort(-scores, kind = 'stable')], baseline_rows[np.argsort(-baseline, kind = 'stable')])
+
+
+## Candidates of the inverted skills index are the volunteers with a non-zero cosine score (the baseline's filtering)
+def test_candidates(table):
+
+    config, processed_df, skill_index = table
+
+    for skills_input in searches(config, 20, seed = 1):
+        baseline_rows, _ = baseline_scores(config, processed_df, skills_input)
+
+        np.testing.assert_array_equal(skill_index.candidates(list(skills_input)), baseline_rows)
+
+
+## Parallel scoring (the positions split into chunks of the rows) gives the same matches and scores as the single-process scoring
+ # and with k given, the top k of them by score (ties in the order of the rows)
+@pytest.mark.parametrize('k', [None, 5])
+def test_parallel_matching(table, k):
+
+    config, _, skill_index = table
+    matchers = [make_matcher(config, skills_input, 'vectorized') for skills_input in searches(config, 8, seed = 2)]
+
+    for matcher, (rows, scores) in zip(matchers, parallel_matching(matchers, skill_index, workers = 2, chunk_rows = 25, k = k)):
+        expected_rows, expected = matcher.match(skill_index)
+        order = np.argsort(-expected, kind = 'stable')[:k] if k is not None else slice(None)
+
+        np.testing.assert_array_equal(rows, expected_rows[order])
+        np.testing.assert_array_equal(scores, expected[order])
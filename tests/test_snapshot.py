@@ -0,0 +1,59 @@
+import os
+
+import pandas as pd
+import pytest
+
+from skill_index import SkillIndex
+from snapshot import CSVSource, SnapshotCache, snapshot_fingerprint
+
+
+## Function for the cache of the CSV tables in the directory with the on-disk snapshots (the cleaned data frames are pickled)
+def csv_cache(directory, cache_dir, skills_map, background_refresh = False):
+
+    return SnapshotCache(CSVSource(str(directory)), lambda raw_df: raw_df, '_timestamp',
+                         cache_dir = str(cache_dir), background_refresh = background_refresh,
+                         fingerprint = snapshot_fingerprint(f'csv:///{directory}', skills_map, {}))
+
+
+## Function for writing the table with given number of rows (all with the same timestamp)
+def write_table(directory, n_rows):
+
+    os.makedirs(directory, exist_ok = True)
+    pd.DataFrame({'Name': [f'User {i}' for i in range(n_rows)], '_timestamp': '2023-06-01 10:00:00'}).to_csv(
+        os.path.join(directory, 'volunteers.csv'), index = False)
+
+
+## Snapshot of another data source with the same table's timestamp is not served from the disk
+def test_other_source(tmp_path):
+
+    write_table(tmp_path / 'large', 500)
+    write_table(tmp_path / 'small', 50)
+
+    assert len(csv_cache(tmp_path / 'large', tmp_path / 'cache', {}).get('volunteers').data) == 500
+    assert len(csv_cache(tmp_path / 'small', tmp_path / 'cache', {}).get('volunteers').data) == 50
+    # The latest on-disk snapshot served by a new process right away is of its own data source too
+    assert len(csv_cache(tmp_path / 'small', tmp_path / 'cache', {}, background_refresh = True).get('volunteers').data) == 50
+
+
+## Snapshot built with another skills map is not served from the disk
+def test_other_skills_map(tmp_path):
+
+    write_table(tmp_path / 'tables', 10)
+
+    snapshot = csv_cache(tmp_path / 'tables', tmp_path / 'cache', {'Python': 'python'}).get('volunteers')
+
+    assert csv_cache(tmp_path / 'tables', tmp_path / 'cache', {'Python': 'python'}).get('volunteers').path == snapshot.path
+    assert csv_cache(tmp_path / 'tables', tmp_path / 'cache', {'Rust': 'rust'}).get('volunteers').path != snapshot.path
+
+
+## Skills index built with other skills (columns) is not loaded
+def test_other_skills_index(tmp_path):
+
+    processed_df = pd.DataFrame({'python': [1, 0], 'python_level': ['junior', 'nan'],
+                                 'rust': [0, 1], 'rust_level': ['nan', 'senior']})
+    SkillIndex(processed_df, {'Python': 'python', 'Rust': 'rust'}, 'skill_y_lvl_n', 'skill_n_lvl_n').save(tmp_path)
+
+    assert SkillIndex.load(tmp_path, ['python', 'rust']).skills == ['python', 'rust']
+
+    with pytest.raises(ValueError):
+        SkillIndex.load(tmp_path, ['rust', 'python'])
@@ -8,225 +8,321 @@ warnings.filterwarnings('ignore')
 
 import os
 import json
-import yaml
-import codecs
+import itertools
+import threading
 from datetime import datetime
 
 import pytz
-from io import BytesIO
 from dotenv import load_dotenv
 
-import numpy as np
-import pandas as pd
+import urllib
 
-from scipy.spatial import distance
-from sklearn.metrics.pairwise import cosine_similarity
+from flask import Flask, render_template, request, redirect, jsonify, Response, abort, stream_with_context, g
 
-import sqlalchemy
-import snowflake
+# The scoring stack (pandas, NumPy, matcher, skills index) is imported lazily by the routes which need it,
+    # so the Lambda cold start of the login page and the form does not pay its import time
+from snapshot import SnapshotCache, clean_snapshot, source_from_env, source_url_from_env, snapshot_fingerprint
+from result_store import result_store_from_config, size_of
+from match_cache import MatchCache
+from export import EXPORT_FORMATS, export_available, formatted_chunks, excel_stream, csv_stream, parquet_stream
+from instrumentation import stage, begin_request, end_request, current_timings, log_request, RequestProfiler
+from compiled_config import ConfigLoader, SNAPSHOT_KEYS
 
-import urllib
 
-from flask import Flask, render_template, request, redirect, jsonify, Response
+## Function for checking the login credentials
+def check_authentication(username, password, cred_username, cred_password):
+
+    if (cred_username == username) and (cred_password == password):
+        return True
+
+    else:
+        return False
+
+
+
+## Function for reading input skills properties (name / level / weight) from the form's fields
+ # (or from any dictionary with the same fields, e.g., the positions in the batch matching)
+def parse_skills_input(form, skills_map):
+
+    # Dictionary for storing the skills and their respective levels from the form
+    skills_flask_input = {}
+
+    for key, value in form.items():
+
+        # Obtain skills properties' inputs
+        if key.startswith('option_skill'):
 
+            skill_name = skills_map[value]
+            level = (form.get(f'level_skill{key.split("option_skill")[1]}') or '').lower()
+            weight = form.get(f'skill_weight{key.split("option_skill")[1]}')
 
-# Class for skills matching scoring
-class SkillsMatcher:
-    def __init__(self,
-                 skills_input, #Input from the form (skills' names, levels and weights)
-                 default_cols, # Default columns in the output table
-                 output_cols, # Additional output columns (for volunteers / mentors)
-                 X_const, # Constant variable for penalizing missing skills
-                 skill_y_lvl_n_name, # Indicator for non-missing skill with missing level
-                 skill_n_lvl_n_name # Indicator for missing skill and missing level
-                 ):
-
-        # List of skills names'
-        self.input_skills = list(skills_input.keys())
-        # Dictionary of skills names, levels and weights
-        self.input_skills_levels = skills_input
-        # Output columns in the result table
-        self.display_columns = default_cols + [f'{i}_level' for i in self.input_skills_levels.keys()] + output_cols
-        # Scoring column name (Assuming its in the last position of the list)
-        self.scoring_name = default_cols[-1]
-         # Indicator for non-missing skill with missing level
-        self.skill_y_lvl_n_name = skill_y_lvl_n_name
-        # Indicator for missing skill and missing level
-        self.skill_n_lvl_n_name = skill_n_lvl_n_name
-        # Constant variable for penalizing missing skills
-        self.X_const = X_const
-        
-        # 0-1 matrix of baseline and the volunteers/mentors (w.r.t. skills' occurrences)
-        self.indicator_skills_matrix = None
-        # Matrix of baseline and the volunteers/mentors (w.r.t. skills' levels and weights)
-        self.lvl_skills_matrix = None
-        # Matrix of inverses of distances of baseline and the volunteers/mentors
-        self.inv_dist_matrix = None
-        
-
-
-    # Data Preparation for scoring
-    def preprocess_data(self, preprocessed_df):
-
-        self.preprocessed_df = preprocessed_df.copy()
-       
-        # Baseline vector for cosine similarity (based on the input skills)
-        baseline = pd.DataFrame({k: 1 for k in self.input_skills}, index = [0])
-
-        # Volunteers'/Mentors' skills
-        df_skills = self.preprocessed_df[self.input_skills].copy()
-
-        # Joining the baseline and the skills matrix of volunteers/mentors
-        df_skills = pd.concat((baseline, df_skills)).reset_index(drop = True)
-
-        # 0-1 matrix of baseline and the volunteers/mentors (w.r.t. skills' occurrences)
-        self.indicator_skills_matrix = df_skills.values
-
-        return self.indicator_skills_matrix
-
-
-    # Scoring of the skills' occurrences - cosine similarity
-    def skills_indicator(self, preprocessed_df):
-
-        preprocessed_df = preprocessed_df.copy()
-
-        # Similarity based on cosine similarity
-        similarity_matrix = cosine_similarity(self.indicator_skills_matrix)
-
-        # 1st row indicates the cosine scores for the baseline vector with others starting from 2nd position
-            # i.e., excluding the score of the baseline with itself
-        self.preprocessed_df['cosine_score'] = similarity_matrix[0, 1:]
-
-        return self.preprocessed_df
-
-
-
-    def similarity_matching(self, preprocessed_df):
-
-        # Data preparation
-        preprocessed_df = self.preprocess_data(preprocessed_df)
-
-        # Cosine scoring
-        cosine_scoring_df = self.skills_indicator(preprocessed_df)
-
-        # Filtering non-zero cosine scores
-            # i.e., excluding the users with no matches
-        output_df = cosine_scoring_df.query('cosine_score > 0').reset_index(drop = True).copy()
-
-        # Baseline vector of skills' levels
-        baseline = pd.DataFrame({f'{k}_level': v['level'] for k, v in self.input_skills_levels.items()},
-                                index=['baseline']).rename_axis('id')
-        # Volunteers'/Mentors' skills' levels
-        df_skills = output_df[[f'{i}_level' for i in self.input_skills_levels.keys()]]
-
-        # Joining the baseline and the skills' levels matrix of volunteers/mentors
-        df_skills = pd.concat((baseline, df_skills))
-
-        # Encoding the string skills' levels into numeric levels
-        for col, level_weight in zip([f'{i}_level' for i in self.input_skills_levels.keys()], self.input_skills_levels.values()):
-            
-            # Optional weigthing for penalizing the dissimilarity of the skills' levels w.r.t. baseline
-            try:
-                level = level_weight['level']
-                weight = level_weight['weight']
-            except:
-                level = level_weight['level']
-                weight = 1
-
-            ## The volunteers/mentors who have the same skill level for given skill as the baseline has numeric value:
-                # These volunteers/mentors will then have 0 distance -> perfect similarity score for given skill
-            ## The volunteers/mentors with the nearest higher level will have lower non-value than the volunteers/mentors with the nearest lower level, w.r.t. baseline:
-                # e.g., if we look for Python mediors, hence Python seniors will have higher scores than Python juniors (we prefer higher level over lower level)
-            ## If the skill level is missing, but the volunteer/mentor has given skill, then it will have the the highest value (higher distance) than the other skill values (junior, medior, senior, mentor)
-            ## If the skill level missing and the volunteer/mentor does not have given skill, then it will have the highest possible value given by the X_const (i.e., the highest distance) (the least preferred option)
-                # This is applicable when we required more than one skill, hence through the cosine filtering will pass any volunteers/mentors having at least one skill in common w.r.t. baseline.
-            ## Special case is if the baseline's skill level is empty, i.e., we do not prefer any skill level, just the skill itself.
-                # Hence all the volunteers/mmentors who have non-empty skill level for given skill (junior/medior/senior/mentor) or have given skill but missing skill level, will have value 0 -> zero distance -> higher score
-                # All the others will have non-zero value given by X_const.
-
-            if level == 'junior':
-                df_skills[col] = weight * df_skills[col].replace({'junior': 0, 'medior': 0.25,'senior': 0.5, 'mentor': 0.75,
-                                                                  self.skill_y_lvl_n_name: 1, self.skill_n_lvl_n_name: self.X_const})
-            elif level == 'medior':
-                df_skills[col] = weight * df_skills[col].replace({'junior': 0.5, 'medior': 0, 'senior': 0.25, 'mentor': 0.75,
-                                                                  self.skill_y_lvl_n_name: 1, self.skill_n_lvl_n_name: self.X_const})
-            elif level == 'senior':
-                df_skills[col] = weight * df_skills[col].replace({'junior': 0.75, 'medior': 0.5, 'senior': 0, 'mentor': 0.25,
-                                                                  self.skill_y_lvl_n_name: 1, self.skill_n_lvl_n_name: self.X_const})
-            elif level == 'mentor':
-                df_skills[col] = weight * df_skills[col].replace({'junior': 0.75, 'medior': 0.5, 'senior': 0.25, 'mentor': 0,
-                                                                  self.skill_y_lvl_n_name: 1, self.skill_n_lvl_n_name: self.X_const})
+            # Accessing weights - if not filled, default weight is 1
+            if weight:
+                weight = float(weight)
             else:
-                df_skills[col] = [weight * self.X_const if i == self.skill_n_lvl_n_name else 0 for i in df_skills[col]]
+                weight = 1.0
+
+            # Storing the baseline input skills properties into a dictionary
+            skills_flask_input[skill_name] = {'level': level, 'weight': float(weight)}
+
+    return skills_flask_input
+
+
+## Function for the ranking table of the matched volunteers / mentors (their scores and the other sorting columns only)
+ # The rows' index gives their positions in the matched rows, the other output columns are materialized only for the displayed rows
+def ranking_table(display, rows, scores, looking_for, config):
+
+    scoring_name = config['out_cols']['default'][-1]
+
+    ranking = display.take(rows, [col for col in sort_columns(looking_for, config)[0] if col != scoring_name])
+    ranking[scoring_name] = scores
+
+    return ranking
+
+
+## Function for the displayed rows of the result table (the ranked rows given by their positions in the matched rows)
+ # The output columns are taken from the display store of the matched rows, the required skills' levels
+ # and the other skills (with their levels) of the volunteers / mentors from their matched skills
+ # i.e., the skills which they have excluding the required skills from the form
+def shown_rows(ranked, search, config):
 
-        # Matrix of baseline and the volunteers/mentors (w.r.t. skills' levels and weights)
-        self.lvl_skills_matrix = df_skills.values
+    positions = ranked.index.to_numpy()
+    scoring_name = config['out_cols']['default'][-1]
+    cols = (config['out_cols']['default']
+            + [f'{skill}_level' for skill in search['skills_input']]
+            + config['out_cols'][search['looking_for'].lower()])
 
-        # Calcuation of inverse of the distance metrics:
-            # Euclidean, Manhattan and Mahalanobis
-            # Absolute (cumulative) distances normed by the number of skills -> average distances
-            # Inverse distance -> similarity score: 1 / (avg_dist + 1) --> zero distance --> 100% score
+    skills_output = search['display'].take(positions, [col for col in cols if col in search['display'].columns])
+    skills_output.index = ranked.index
 
-        euclidean_dist = distance.squareform(distance.pdist(self.lvl_skills_matrix, metric = 'euclidean'))
-        euclidean_similarity_matrix = 1 / (euclidean_dist / len(self.input_skills)  + 1)
-        output_df['euclidean_score'] = euclidean_similarity_matrix[0, 1:]
+    skills_output[scoring_name] = ranked[scoring_name]
 
-        manhattan_dist = distance.squareform(distance.pdist(self.lvl_skills_matrix, metric = 'cityblock'))
-        manhattan_similarity_matrix = 1 / (manhattan_dist / len(self.input_skills) + 1)
-        output_df['manhattan_score'] = manhattan_similarity_matrix[0, 1:]
+    for skill, levels in zip(search['skills_input'], search['skills'].levels(positions, search['skills_input']).T):
+        skills_output[f'{skill}_level'] = levels
 
-        # Final inverses' average distances' matrix as an average of of inverses' average distances
+    skills_output[config['other_skills']] = search['skills'].other_skills(positions)
+
+    return skills_output[cols]
+
+
+## Function for the Skill Matching Scoring object initialization based on:
+    # Skill inputs from the form as a baseline
+    # Default output columns, i.e., name, ID, email
+    # variable output columns, depending on the volunteer / mentor selection
+    # Constant value for penalizing missing skills
+    # Indicator for non-missing skill with missing level
+    # Indicator for missing skill and missing level
+    # The other skills are not scored, they are added only to the displayed rows (see shown_rows)
+    # Optional partial credit of the related skills (skills' co-occurrence in the volunteers' / mentors' table)
+def make_matcher(skills_flask_input, looking_for, config, related_skills = False):
+
+    from matcher import SkillsMatcher
+
+    return SkillsMatcher(skills_flask_input, # Skills iinput from the form - baseline
+                         config['out_cols']['default'], # Default output columns
+                         config.output_cols[looking_for.lower()], # Variable output columns
+                         config['X_const'], # Constant variable for penalizing missing skills
+                         config['mapping_lvl_nan']['skill_y_lvl_n'], # Indicator for non-missing skill with missing level
+                         config['mapping_lvl_nan']['skill_n_lvl_n'], # Indicator for missing skill and missing level
+                         backend = config['scoring_backend'], # Scoring backend
+                         level_distance = config.level_distance, # Distances of the skill levels from the required level
+                         related_skills = config['related_skills']['min_similarity'] if related_skills else None # Minimal similarity of the related skills
+                         )
+
+
+## Function for the date of the last update of the volunteers' / mentors' table (of the snapshot used by the search)
+def last_updated_date(snapshot):
+
+    return datetime.strptime(str(snapshot.timestamp), '%Y-%m-%d %H:%M:%S').strftime('%d. %m. %Y')
+
+
+## Function for the sorting columns (English columns' names before translation) and their orders of the result table
+def sort_columns(looking_for, config):
+
+    return config.sort_columns[looking_for.lower()]
+
+
+## Function for converting floats as string into integers
+ # They contain empty strings instead N/A, thus we need to replace them first
+ # Since the string values have decimals, we then convert them into floats (cannot be converted directly into integers
+ # Then finally we convert floats into integers
+def to_integer(column):
+
+    import numpy as np
+
+    return column.replace({'': np.nan}).astype('float').astype('Int64')
+
+
+## Function for the output columns which can be converted into integers (for all the rows)
+def integer_columns(skills_output, cols):
+
+    integer_cols = []
+
+    for col in cols:
         try:
-            mahalanobis_dist = distance.squareform(distance.pdist(self.lvl_skills_matrix, metric='mahalanobis'))
-            mahalanobis_similarity_matrix = 1 / (mahalanobis_dist / len(self.input_skills) + 1)
-            output_df['mahalanobis_score'] = mahalanobis_similarity_matrix[0, 1:]
-            
-            # Average of all the three inverses' average distances
-            self.inv_dist_matrix = np.mean([euclidean_similarity_matrix, manhattan_similarity_matrix, mahalanobis_similarity_matrix], axis = 0)
+            to_integer(skills_output[col])
+            integer_cols.append(col)
         except:
-            # Average of all inverses' average Euclidean and Manhattan distances only, without Mahalanobis distance
-                # Due to the singularity matrix for inverse - this happens when the baseline has only one skill without required level.
-                    # Hence after cosine scoring, it will keep all the users having given skill.
-                    # Since there are not users without given skill, all users will have zero numeric value
-                    # Hence, the variance will be zero which is reflected in covariance matrix
-                    # Hence it does not have inverse since is has zero determinant.
+            continue
 
-            self.inv_dist_matrix = np.mean([euclidean_similarity_matrix, manhattan_similarity_matrix], axis = 0)
+    return integer_cols
 
-        # Assigning the final score to the result table
-        output_df[self.scoring_name] = np.round(self.inv_dist_matrix[0, 1:], 2)
 
-        # Final result table, including the respective output columns and sorted respectively by score.
-        output_df = output_df[self.display_columns].sort_values(by = self.scoring_name, ascending = False).copy()
+## Function for formatting the rows of the result table for displaying / downloading
+ # (skill names with diacritics, capitalized skill levels, integers, dates and Czech columns' names and values)
+    # The columns converted into integers are given for the whole result table, so all its parts are formatted the same way
+    # The renaming maps are compiled with the configuration (see compiled_config.py)
+def format_result(skills_output, skills_flask_input, looking_for, integer_cols, config):
 
-        return output_df
+    import pandas as pd
 
+    # Renaming the skill names in the result table (with diacritics)
+    skills_output = skills_output.rename(columns = config.level_names)
 
-## Function for checking the login credentials
-def check_authentication(username, password, cred_username, cred_password):
+    
+    # Capitalizing the skill levels
+    for skill_col in skills_flask_input.keys():
+        skills_output[config.skill_names[skill_col]] = (
+                                                        skills_output[config.skill_names[skill_col]]
+                                                         .replace(config['lvl_map'])
+                                                         )
 
-    if (cred_username == username) and (cred_password == password):
-        return True
 
-    else:
-        return False
 
+    # Converting floats as string into integers in the oouput columns (if possible for the whole result table)
+    for col in integer_cols:
+        skills_output[col] = to_integer(skills_output[col])
+           
+    # Converting date columns from YYYY-MM-DD to DD.MM.YYYY if possible:
+    try:
+        skills_output[config['last_email_sent']] = (
+                                                    pd.to_datetime(skills_output[config['last_email_sent']])
+                                                    .dt.strftime('%d.%m.%Y')
+                                                    .fillna('')
+                                                    )
+    except:
+        pass
+
+    # Renaming the ouput columns from English to Czech
+    skills_output = skills_output.rename(columns = config.translate[looking_for.lower()])
+
+    # Renaming the project indicator column's values from English to Czech
+    skills_output[config['on_project_now']['col']] = (
+                                                      skills_output[config['on_project_now']['col']]
+                                                      .replace(config['on_project_now']['val'])
+                                                      )
+    
+    # Replace N/A with 0 for the number of past projects in Cesko.Digitall
+    skills_output[config['project_count']] = skills_output[config['project_count']].fillna(0)
+
+    return skills_output
+
+
+## Function for the ranked rows of the given page of the result table (sorted by score and other sorting columns)
+ # The stored ranking table is already ranked (see scored_matches), the page is only sliced from it
+def page_ranking(search, page, config):
+
+    page_size = config['page_size']
+
+    return search['matches'].iloc[page * page_size:(page + 1) * page_size]
+
+
+## Function for the formatted ranked rows of the result table
+def format_rows(ranked, search, config):
+
+    return format_result(shown_rows(ranked, search, config), search['skills_input'],
+                         search['looking_for'], search['integer_cols'], config)
+
+
+## Function for the given page of the result table (formatted rows sorted by score and other sorting columns)
+def result_page(search, page, config):
+
+    ranked = page_ranking(search, page, config)
+
+    with stage('format'):
+        return format_rows(ranked, search, config)
+
+
+## Function for the text of the result table's cell (the same as the values of the next pages shown by JavaScript)
+ # Missing values are empty, whole numbers are shown without decimals
+def cell_text(value):
+
+    import pandas as pd
+
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return ''
+
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+
+    return str(value)
+
+
+## Function for the rows of the result table for the row template (row number and the cells' texts)
+ # The chunks of the formatted rows are generated while the page is being streamed
+def table_rows(chunks):
 
+    index = 0
 
-## Function for preparning email template based on the default template
- # it will insert the respective fields for position name, link and description
-def prep_email_template(positions, email_template, config):
+    for chunk in chunks:
+        for values in chunk.itertuples(index = False, name = None):
+            yield index, [cell_text(value) for value in values]
+            index += 1
 
-    with codecs.open(email_template, 'r', encoding = 'utf-8') as file:
-        body_email = file.read()
 
-    body_email = (body_email
-                      .replace(config['email_inputs']['name'], positions['name'])
-                      .replace(config['email_inputs']['desc'], positions['desc'])
-                      .replace(config['email_inputs']['link'], positions['link'])
-                      )
+## Function for the streamed result page with the first page of the result table (sorted by score and other sorting columns)
+ # The page is rendered from the rows by the row template (with escaping) and sent in chunks,
+ # so the browser starts painting the top matches before the rest of the table is generated
+    # The first chunk of rows is formatted right away (for the columns' names), the next chunks while the page is streamed
+def result_page_stream(search, search_id, last_updated, config):
 
-    return body_email
+    chunks = formatted_chunks(page_ranking(search, 0, config), lambda chunk: format_rows(chunk, search, config),
+                              config['render_chunk_rows'])
+    with stage('format'):
+        first = next(chunks)
+
+    columns = list(first.columns)
+    context = {'columns': columns,
+               'rows': table_rows(itertools.chain([first], chunks)),
+               'send_email': config['send_email'],
+               'profile_index': columns.index(config['profile']) if config['profile'] in columns else -1,
+               'total': len(search['matches']),
+               'search_id': search_id,
+               'last_updated': last_updated}
+    app.update_template_context(context)
+
+    stream = app.jinja_env.get_template('result.html').stream(context)
+    stream.enable_buffering(config['render_buffer'])
+
+    return stream
+
+
+## Function for building the skills index of the cleaned volunteers' / mentors' table (once per snapshot)
+def build_skill_index(processed_df, config):
+
+    from skill_index import SkillIndex
+
+    return SkillIndex(processed_df,
+                      config.skills_map,
+                      config['mapping_lvl_nan']['skill_y_lvl_n'],
+                      config['mapping_lvl_nan']['skill_n_lvl_n'])
+
+
+## Function for the displayed columns of the volunteers' / mentors' tables (all the output columns)
+ # The scores, skills' levels and other skills are not stored, they are given by the scoring and the skills index
+def display_columns(config):
+
+    excluded = {config['out_cols']['default'][-1], config['other_skills']}
+
+    return list(dict.fromkeys(col for cols in config['out_cols'].values() for col in cols if col not in excluded))
+
+
+## Function for building the compact store of the displayed columns of the cleaned table (once per snapshot)
+def build_display(processed_df, config):
+
+    from display_store import DisplayStore
+
+    return DisplayStore.from_frame(processed_df, display_columns(config))
 
 
 ## Function for opening a new gmail message template with inserted subject, body text and Bcc.
@@ -242,24 +338,188 @@ def open_gmail_new_message(bcc, subject, body):
 # Loading the environmen tvariables (such as credentials)
 load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'inputs', '.env'))
 
-# Lpading configuration file for data frame operations
-with open(os.path.join(os.path.dirname(os.path.abspath(__file__)),
-                                        'inputs', 'config.yaml'),
-                        'r',  encoding='utf-8') as f:
-    
-    config = yaml.safe_load(f)
+# Compiled configuration (config.yaml with the skills map, email template and the lookup tables derived from them)
+    # It is validated here, so a broken configuration fails the app's start, and the requests reload it when its files change
+config_loader = ConfigLoader(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'inputs', 'config.yaml'))
+
+# Configuration at the start of the app (the caches, stores and profiler below keep it until the restart)
+config = config_loader.config
+
 
 
 
+## Function for checking whether the app runs on AWS Lambda
+ # The Lambda containers are frozen between the invocations, so no background threads are started there
+def on_lambda():
+
+    return bool(os.getenv('AWS_LAMBDA_FUNCTION_NAME'))
+
+
+# Cache of the volunteers' / mentors' tables (skills index and the compact store of the displayed columns)
+    # The tables are pulled from the data source only when their timestamp advances
+    # The on-disk snapshots are keyed also by the data source, skills map and the configuration they are built with
+    # On Lambda, the outdated tables are refreshed on the request path (a frozen background refresh would never complete)
+snapshot_cache = SnapshotCache(source_from_env(),
+                               lambda raw_df: clean_snapshot(raw_df, config.skills_map, config),
+                               config['timestamp'],
+                               build_index = lambda processed_df: build_skill_index(processed_df, config),
+                               build_display = lambda processed_df: build_display(processed_df, config),
+                               check_interval = config['snapshot']['check_interval'],
+                               cache_dir = config['snapshot']['cache_dir'],
+                               columns = config.required_columns,
+                               background_refresh = config['snapshot']['background_refresh'] and not on_lambda(),
+                               fingerprint = snapshot_fingerprint(source_url_from_env(), config.skills_map,
+                                                                  {key: config[key] for key in SNAPSHOT_KEYS}),
+                               skills = list(config.skills_map.values()))
+
+
+## Function for the names of the volunteers' / mentors' tables (given by the environment variables)
+def table_names():
+
+    return [os.getenv(f'snowflake_{looking_for}') for looking_for in ('volunteer', 'mentor')
+            if os.getenv(f'snowflake_{looking_for}')]
+
+
+## Function for refreshing the snapshots of all the tables off the request path
+ # Called by the scheduled warmup event on Lambda (see serverless.yml)
+def refresh_snapshots():
+
+    for table_name in table_names():
+        snapshot_cache.refresh(table_name)
+
+
 
 # Flask app initialization
 app = Flask(__name__)
 
 
-# Global variables which will be assigned in the app later
-position_info = None
-body_email = None
-skills_output_excel = None
+# Opt-in profiling of the requests (cProfile / tracemalloc), only for debugging as it slows the requests down
+profiler = (RequestProfiler(config['instrumentation']['profile_dir'],
+                            cpu = config['instrumentation']['profile'],
+                            memory = config['instrumentation']['tracemalloc'])
+            if config['instrumentation']['profile'] or config['instrumentation']['tracemalloc'] else None)
+
+
+# Polling of the tables' last update by the long-running server, started with its first request (not at the import)
+    # The Lambda containers are frozen between the invocations, they are refreshed by the scheduled warmup event instead
+@app.before_request
+def start_snapshot_polling():
+
+    if config['snapshot']['poll_interval'] and not on_lambda():
+        snapshot_cache.start_polling(table_names(), config['snapshot']['poll_interval'])
+
+
+# Starting the stage timings (and the profiling if enabled) of the request
+@app.before_request
+def start_instrumentation():
+
+    if request.endpoint == 'static':
+        return
+
+    config = config_loader.get()
+
+    if config['instrumentation']['timings']:
+        begin_request()
+
+    if profiler is not None and request.path in config['instrumentation']['profile_paths']:
+        g.profiling = profiler.start()
+
+
+# Stage timings of the request in the Server-Timing header and in the structured log line
+    # (the streamed downloads are measured until their streaming starts)
+@app.after_request
+def finish_instrumentation(response):
+
+    profile = profiler.stop(request.path) if g.get('profiling') else {}
+    timings = current_timings()
+
+    if timings is not None:
+        response.headers['Server-Timing'] = timings.server_timing()
+        # Cumulative statistics of the matches' cache are logged with the searches which used it
+        if any(name.startswith('match_cache') for name in timings.counters):
+            profile['match_cache'] = match_cache.stats()
+        log_request(request.method, request.path, response.status_code, timings, **profile)
+
+    end_request()
+
+    return response
+
+
+# Store of the search results keyed by the search ID
+    # (scored volunteers/mentors, the search's inputs, position information and email template)
+result_store = result_store_from_config(config['result_store'])
+
+
+## Function for accessing the stored search result of the search ID from the request
+def get_search_result():
+
+    search_result = result_store.get(request.args.get('search_id', ''))
+
+    if search_result is None:
+        abort(404, description = 'The search result has expired, please submit the form again.')
+
+    return search_result
+
+
+## Function for the JSON payload of the API request, anything else than a JSON object is rejected with 400
+def request_payload():
+
+    payload = request.get_json()
+
+    if not isinstance(payload, dict):
+        abort(400, description = 'The request body must be a JSON object.')
+
+    return payload
+
+
+## Function for the volunteers / mentors looked for given by the JSON payload (Volunteer if not given)
+ # Anything else than Volunteer or Mentor is rejected with 400 (e.g., null)
+def payload_looking_for(payload, config):
+
+    looking_for = payload.get('looking-for', 'Volunteer')
+
+    if not isinstance(looking_for, str) or looking_for.lower() not in config.output_cols:
+        abort(400, description = '"looking-for" must be Volunteer or Mentor.')
+
+    return looking_for
+
+
+## Function for the number of the returned matches / positions given by the JSON payload (the default if not given)
+ # Anything else than a positive integer is rejected with 400 (e.g., "5" or -1)
+def payload_top_k(payload, default):
+
+    k = payload.get('top_k', default)
+
+    if isinstance(k, bool) or not isinstance(k, int) or k < 1:
+        abort(400, description = '"top_k" must be a positive integer.')
+
+    return k
+
+
+# Cache of the scored matches keyed by the normalized search (skills, levels and weights) and the snapshot version
+    # e.g., the same search submitted again or with the skills in a different order is not scored again
+match_cache = MatchCache(config['match_cache']['max_bytes'])
+
+
+## Function for the matched rows of the snapshot and their ranked ranking table (scores and sorting columns), memoized by the search
+ # The ranking table is sorted once by the sorting columns, its index gives the ranked rows' positions in the matched rows
+ # The sorting columns and their orders are part of the key, as the ranking table is sorted by them (they may change with the reloaded configuration)
+def scored_matches(matcher, skills_flask_input, looking_for, snapshot, config):
+
+    from matcher import top_k
+
+    sort_cols, ascending = sort_columns(looking_for, config)
+    key = match_cache.key(skills_flask_input, looking_for, snapshot, matcher) + (tuple(sort_cols), tuple(ascending))
+    matches = match_cache.get(key)
+
+    if matches is None:
+        rows, scores = matcher.match(snapshot.index)
+
+        with stage('sort'):
+            matches = (rows, top_k(ranking_table(snapshot.data, rows, scores, looking_for, config), sort_cols, ascending))
+        match_cache.put(key, matches, rows.nbytes + size_of(matches[1]))
+
+    return matches
 
 
 # Login page
@@ -302,8 +562,10 @@ def get_login():
 @app.route('/form')
 def skills():
 
+    config = config_loader.get()
+
     # Render the skill form page
-    return render_template('form.html')
+    return render_template('form.html', related_skills = config['related_skills']['enabled'])
 
 
 
@@ -311,23 +573,13 @@ def skills():
 # Result page with an output table
 @app.route('/result', methods=['POST'])
 def result():
+
+    with stage('imports'):
+        from skill_index import MatchedSkills
     
-    # Read JSON file for mapping skills' names (columns' names -> names with diacritics)
-    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)),
-                           config['input_dir'],
-                           config['skills_map']), 'r') as f:
-        
-        skills_map = json.load(f)
-
-
-    ## Accessing email template path
-    email_template = os.path.join(os.path.dirname(os.path.abspath(__file__)),
-                                    config['input_dir'],
-                                    config['email_template'])
+    # Compiled configuration (incl. the mapping of skills' names and the email template)
+    config = config_loader.get()
     
-    # Dictionary for storing the skills and their respective levels from the form
-    skills_flask_input = {}
-
     # Mentor / Volunteer (retrieved from the form)
     looking_for = request.form.get('looking-for')
 
@@ -336,242 +588,225 @@ def result():
     position_link = request.form.get('position_link0')
     position_description = request.form.get('position_description0')
 
-    # Storing position information dictiionary with the inputs from the form
-    global position_info 
+    # Position information dictiionary with the inputs from the form
     position_info = {'name': position_name, 'link': position_link, 'desc': position_description}
 
-    # Preparing and storing new email template with the position's information
-    global body_email
-    body_email = prep_email_template(position_info, email_template, config)
+    # Preparing new email template with the position's information
+    body_email = config.email_body(position_info)
 
 
     # Reading input skills properties (name / level / weight) from the form
-    for key, value in request.form.items():
+    skills_flask_input = parse_skills_input(request.form, config.skills_map)
 
-        # Obtain skills properties' inputs
-        if key.startswith('option_skill'):
+    # Cleaned volunteers' / mentors' table (pulled from the data source only if it was updated)
+    table_name = os.getenv(f'snowflake_{looking_for.lower()}')
+    with stage('snapshot'):
+        snapshot = snapshot_cache.get(table_name)
 
-            skill_name = skills_map[value]
-            level = request.form.get(f'level_skill{key.split("option_skill")[1]}').lower()
-            weight = request.form.get(f'skill_weight{key.split("option_skill")[1]}')
+    display = snapshot.data
 
-            # Accessing weights - if not filled, default weight is 1
-            if weight:
-                weight = float(weight)
-            else:
-                weight = 1.0
+    # Output columns in the result table
+    opt_output_cols = config['out_cols'][looking_for.lower()]
 
-            # Storing the baseline input skills properties into a dictionary
-            skills_flask_input[skill_name] = {'level': level, 'weight': float(weight)}
+    # Skill Matching Scoring object initialization (with the partial credit of the related skills if checked in the form)
+    skills_level_matcher = make_matcher(skills_flask_input, looking_for, config, related_skills = bool(request.form.get('related_skills')))
+    
+    # Scoring - matched rows of the snapshot and their ranking table (ranked by score and other sorting columns)
+        # The same search against the same snapshot is taken from the cache, incl. its ranking
+    rows, ranking = scored_matches(skills_level_matcher, skills_flask_input, looking_for, snapshot, config)
+
+    # Storing the ranking table of the scored volunteers/mentors, the displayed columns and the skills of the matched rows only
+        # with the position information and email template for the next pages, Excel output and emails (under a new search ID)
+    with stage('store'):
+        matched_display = display.subset(rows)
+        search_result = {'matches': ranking,
+                         'display': matched_display, 'skills': MatchedSkills(snapshot.index, rows, skills_flask_input.keys()),
+                         'skills_input': skills_flask_input,
+                         'looking_for': looking_for, 'position_info': position_info, 'body_email': body_email,
+                         'integer_cols': matched_display.integer_columns(opt_output_cols)}
+        search_id = result_store.put(search_result)
 
-    # Snowflake credentials
-    snowflake_account = os.getenv('snowflake_account')
-    snowflake_user = os.getenv('snowflake_user')
-    snowflake_password = os.getenv('snowflake_password')
-    snowflake_warehouse = os.getenv('snowflake_warehouse')
-    snowflake_database = os.getenv('snowflake_database')
-    snowflake_schema = '"{}"'.format(os.getenv('snowflake_schema'))
+    # Obtaining the date of the last update in the SnowFlake databases
+    last_updated = last_updated_date(snapshot)
 
-    # Snowflake connection to the volunteers' / mentors' table
-    table_name = os.getenv(f'snowflake_{looking_for.lower()}')
-    sql_query = f'select * from "{table_name}"'
+    # The first page of the result table rendered by the row template and streamed to the browser
+    return Response(stream_with_context(result_page_stream(search_result, search_id, last_updated, config)), mimetype = 'text/html')
 
-    try:
-        conn = (
-                f"snowflake://{snowflake_user}:{snowflake_password}"
-                f"@{snowflake_account}/"
-                f"?warehouse={snowflake_warehouse}"
-                f"&database={snowflake_database}"
-                f"&schema={snowflake_schema}"
-            )
-        
-        engine = sqlalchemy.create_engine(conn)
-        processed_df = pd.read_sql_query(sql_query, engine)
 
-    except:
-        conn = snowflake.connector.connect(
-                                            account = snowflake_schema,
-                                            user = snowflake_user,
-                                            password = snowflake_password,
-                                            warehouse = snowflake_warehouse,
-                                            database = snowflake_database,
-                                            schema = snowflake_schema
-                                        )
 
-        processed_df = pd.read_sql_query(sql_query, conn)
+# Next pages of the result table (as JSON for the "Show more" button)
+@app.route('/result/page')
+def result_next_page():
 
+    config = config_loader.get()
+    search_result = get_search_result()
+    page = request.args.get('page', default = 1, type = int)
 
-    # Keboola bug - it somehow adds an extra underscore to several columns names and remove diacritics
-    for col in processed_df.columns:
-        if '____level' in col:
-            processed_df = processed_df.rename(columns={col: col.replace('____level', '_level')})
-        elif '__level' in col:
-            processed_df = processed_df.rename(columns={col: col.replace('__level', '_level')})
+    if page < 0:
+        abort(400, description = f'Invalid page: {page}')
 
+    skills_output = result_page(search_result, page, config)
 
-    # Excluding Internal Team users, i.e., the employees of Cesko.Digital
-    try:
-        processed_df = processed_df[processed_df[config['drop_rows']['col']] != config['drop_rows']['val']]
-    except:
-        pass
-    
-    # Reset the row indices
-    processed_df = processed_df.reset_index(drop = True)
-
-
-    # Creating column listing all other skills for each volunteer / mentor
-    skills_set = set(skills_map.values())
-
-    # If the skill is missing in given table, add the skill column with 0's (indicating non-occurrence of given skill)
-    # And/or if the skill level column is missing in given table,
-        # add the skill level column with empty strings (indicating missing level for given given skill)
-    # These steps are required for scoring/distance calculations
-
-    for skill in skills_set:
-        if skill not in processed_df.columns:
-            processed_df[skill] = 0
-        if f'{skill}_level' not in processed_df.columns:
-            processed_df[f'{skill}_level'] = ''
-
-    # List of other skills for each volunteer/mentor
-    processed_df[config['other_skills']] = (processed_df[skills_set]
-                                   .apply(lambda row: [
-                                            # Get mapped skills' names based columns' nnames
-                                            {v: k for k, v in skills_map.items()}.get(val) 
-                                                    # Access only skills which given user has
-                                                    for val in row[row.isin(['1', 1])].index 
-                                                        # Remove actual required skills and keep only the other skills
-                                                        if val not in skills_flask_input.keys() and val in skills_set 
-                                                    ],
-                                            axis = 1
-                                        )
-                                    )
-    
-    # Adding skill levels information to the other skills
-    processed_df[config['other_skills']] = (processed_df
-                                   .apply(lambda row:
-                                        # Join the skills strings with the levels into one string
-                                        ' / '.join([f'{skill} ({row[skills_map[skill]+"_level"].capitalize()})'
-                                            # Put the skill level into parentheses
-                                            # If skill level is empty, keep only the skill names w/o skill level
-                                            if len(row[skills_map[skill] + "_level"].capitalize()) > 0 else skill
-                                                for skill in row['OtherSkills']]), axis = 1)
-                                   )
-    for col in skills_set:
-        # Keboola / Snowflake stores the skill indicators (0/1) as strings -> we conver them into numerics
-        processed_df[col] = processed_df[col].astype('float')
-
-        # Remapping None skill levels based on whether the skill is available
-            # If the skill is not missing, but the level is missing -> 'N/A level'
-            # If both the skill and level are missing -> 'X'
-
-        processed_df[f'{col}_level'] = [
-                                            config['mapping_lvl_nan']['skill_y_lvl_n']
-                                                if lvl == '' and ind == 1
-                                            else config['mapping_lvl_nan']['skill_n_lvl_n']
-                                                if lvl == '' and ind == 0
-                                            else lvl
-                                            for ind, lvl in zip(processed_df[col],
-                                                                processed_df[f'{col}_level'])
-                                            ] 
-    
-    # Scoring the skills using the SkillsMatcher based on:
-        # Skill inputs from the form as a baseline
-        # Default output columns, i.e., name, ID, email
-        # variable output columns, depending on the volunteer / mentor selection
-        # Constant value for penalizing missing skills
-        # Indicator for non-missing skill with missing level
-        # Indicator for missing skill and missing level
-    
-    # Output columns in the result table
-    default_out_cols = config['out_cols']['default']
-    opt_output_cols = config['out_cols'][looking_for.lower()]
+    return jsonify({'columns': list(skills_output.columns),
+                    'data': json.loads(skills_output.to_json(orient = 'values', force_ascii = False)),
+                    'profile': config['profile'],
+                    'total': len(search_result['matches'])})
 
-    # Skill Matching Scoring object initialization
-    skills_level_matcher = SkillsMatcher(skills_flask_input, # Skills iinput from the form - baseline
-                                         default_out_cols, # Default output columns
-                                         opt_output_cols, # Variable output columns
-                                         config['X_const'], # Constant variable for penalizing missing skills
-                                         config['mapping_lvl_nan']['skill_y_lvl_n'], # Indicator for non-missing skill with missing level
-                                         config['mapping_lvl_nan']['skill_n_lvl_n'] # Indicator for missing skill and missing level
-                                         )
-    
-    # Scoring - result table
-    skills_output = skills_level_matcher.similarity_matching(processed_df)
 
 
-    # Renaming the skill names in the result table (with diacritics)
-    skills_output = skills_output.rename(columns = {f'{v}_level': k for k, v in skills_map.items() if f'{v}_level' in skills_output.columns})
 
-    
-    # Capitalizing the skill levels
-    skills_map_reversed = {v:k for k, v in skills_map.items()}
+# Batch matching of several positions against the same volunteers' / mentors' table (JSON API)
+    # Input: {"looking-for": "Volunteer" / "Mentor", "top_k": number of returned matches per position,
+    #         "related_skills": partial credit of the related skills (true / false),
+    #         "positions": [{"position_name0": ..., "option_skill0": ..., "level_skill0": ..., "skill_weight0": ..., ...}, ...]}
+    # with the same fields as in the form, the output contains the top ranked matches (columns and rows) for each position
+@app.route('/batch', methods=['POST'])
+def batch():
 
-    for skill_col in skills_flask_input.keys():
-        skills_output[skills_map_reversed[skill_col]] = (
-                                                        skills_output[skills_map_reversed[skill_col]]
-                                                         .replace(config['lvl_map'])
-                                                         )
+    with stage('imports'):
+        from skill_index import MatchedSkills
 
+    payload = request_payload()
 
+    # Compiled configuration (incl. the mapping of skills' names)
+    config = config_loader.get()
+
+    looking_for = payload_looking_for(payload, config)
+    k = payload_top_k(payload, config['batch_top_k'])
+    related_skills = bool(payload.get('related_skills', config['related_skills']['enabled']))
+
+    positions = payload.get('positions')
+    if not isinstance(positions, list) or not positions:
+        abort(400, description = '"positions" must be a non-empty list of positions.')
 
-    # Converting floats as string into integers in the oouput columns (if possible)
-        # They contain empty strings instead N/A, thus we need to replace them first
-        # Since the string values have decimals, we then convert them into floats (cannot be converted directly into integers
-        # Then finally we convert floats into integers
-        for col in opt_output_cols:
-            try:
-                skills_output[col] = skills_output[col].replace({'': np.nan}).astype('float').astype('Int64')
-            except:
-                continue
-           
-    # Converting date columns from YYYY-MM-DD to DD.MM.YYYY if possible:
     try:
-        skills_output[config['last_email_sent']] = (
-                                                    pd.to_datetime(skills_output[config['last_email_sent']])
-                                                    .dt.strftime('%d.%m.%Y')
-                                                    .fillna('')
-                                                    )
-    except:
-        pass
+        positions_inputs = [parse_skills_input(position, config.skills_map) for position in positions]
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        abort(400, description = f'Invalid positions: {e}')
 
-    # Renaming the ouput columns from English to Czech
-    skills_output = skills_output.rename(columns = config['translate']['default'] | config['translate'][looking_for.lower()])
+    if not all(positions_inputs):
+        abort(400, description = 'Each position requires at least one skill.')
 
-    # Obtaining the date of the last update in the SnowFlake databases
-    last_updated = datetime.strptime(str(processed_df[config['timestamp']].iloc[0]), '%Y-%m-%d %H:%M:%S').strftime('%d. %m. %Y')
+    # Cleaned volunteers' / mentors' table (pulled from the data source only if it was updated)
+    with stage('snapshot'):
+        snapshot = snapshot_cache.get(os.getenv(f'snowflake_{looking_for.lower()}'))
+    display = snapshot.data
 
-    # Sorting the result table by score and additionaly by other columns (such as days since registered)
-    skills_output = skills_output.sort_values(by = config['sort'][looking_for.lower()]['cols'],
-                                              ascending = config['sort'][looking_for.lower()]['ascending']).reset_index(drop = True)    
-    
-    # Renaming the project indicator column's values from English to Czech
-    skills_output[config['on_project_now']['col']] = (
-                                                      skills_output[config['on_project_now']['col']]
-                                                      .replace(config['on_project_now']['val'])
-                                                      )
-    
-    # Replace N/A with 0 for the number of past projects in Cesko.Digitall
-    skills_output[config['project_count']] = skills_output[config['project_count']].fillna(0)
+    output = []
 
-    # Storing the result table as a variable for Excel output
-    global skills_output_excel
-    skills_output_excel = skills_output.copy()
+    for position, skills_flask_input in zip(positions, positions_inputs):
+
+        # Scoring of the position (the positions already searched against the same snapshot are taken from the cache)
+        rows, ranking = scored_matches(make_matcher(skills_flask_input, looking_for, config, related_skills = related_skills),
+                                       skills_flask_input, looking_for, snapshot, config)
+
+        ranked = ranking.iloc[:k]
+
+        # Only the returned matches are materialized (the ranked rows are re-indexed to their positions in the returned rows)
+        with stage('format'):
+            returned = rows[ranked.index.to_numpy()]
+            search = {'display': display.subset(returned), 'skills': MatchedSkills(snapshot.index, returned, skills_flask_input.keys()),
+                      'skills_input': skills_flask_input, 'looking_for': looking_for}
+
+            ranked = shown_rows(ranked.reset_index(drop = True), search, config)
+            ranked = format_result(ranked, skills_flask_input, looking_for,
+                                   integer_columns(ranked, config['out_cols'][looking_for.lower()]), config)
+
+        output.append({'name': position.get('position_name0'),
+                       'total': len(rows),
+                       'columns': list(ranked.columns),
+                       'data': json.loads(ranked.to_json(orient = 'values', force_ascii = False))})
+
+    return jsonify({'last_updated': last_updated_date(snapshot), 'positions': output})
+
+
+
+
+# Indexes of the open positions from the positions file, keyed by the volunteers' / mentors' table
+    # (rebuilt when the positions file, the table's snapshot or the compiled configuration changes, e.g., the reloaded level distances)
+position_indexes = {}
+position_indexes_lock = threading.Lock()
+
+
+## Function for the index of the open positions against the snapshot
+ # The positions given by the request are indexed for the request only, the positions file is indexed once per snapshot
+def open_positions_index(snapshot, looking_for, config, positions = None):
+
+    from position_index import PositionIndex, parse_positions, read_positions
+
+    if positions is not None:
+        positions = parse_positions(positions, config.skills_map)
+        return PositionIndex([name for name, _ in positions],
+                             [make_matcher(skills_input, looking_for, config) for _, skills_input in positions], snapshot.index)
+
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), config['input_dir'], config['positions_file'])
+    key = (os.path.getmtime(path), str(snapshot.timestamp), looking_for.lower())
+
+    with position_indexes_lock:
+        cached = position_indexes.get(snapshot.table_name)
+
+        # The compiled configuration is kept with the index, so its identity is compared (the reload compiles a new one)
+        if cached is None or cached[0] != key or cached[1] is not config:
+            positions = read_positions(path, config.skills_map)
+            cached = position_indexes[snapshot.table_name] = (key, config, PositionIndex(
+                [name for name, _ in positions],
+                [make_matcher(skills_input, looking_for, config) for _, skills_input in positions], snapshot.index))
+
+    return cached[2]
+
+
+# Reverse matching - the open positions ranked for a volunteer / mentor (JSON API)
+    # Input: {"looking-for": "Volunteer" / "Mentor", "email": ... (volunteer / mentor in the table)
+    #         or "skills": [{"skill": ..., "level": ...}, ...] (e.g., a new volunteer / mentor not in the table yet),
+    #         "top_k": number of returned positions, "positions": optional positions (the open positions from the positions file by default)}
+    # The positions are given as in the positions file, the output contains the matched positions sorted by score
+@app.route('/reverse', methods=['POST'])
+def reverse():
+
+    with stage('imports'):
+        from position_index import PositionIndex, parse_skills
+
+    payload = request_payload()
+
+    # Compiled configuration (incl. the mapping of skills' names)
+    config = config_loader.get()
+
+    looking_for = payload_looking_for(payload, config)
+    k = payload_top_k(payload, config['reverse_top_k'])
+
+    if not (payload.get('email') or payload.get('skills')):
+        abort(400, description = '"email" or "skills" of the volunteer / mentor is required.')
+
+    # Cleaned volunteers' / mentors' table (pulled from the data source only if it was updated)
+    with stage('snapshot'):
+        snapshot = snapshot_cache.get(os.getenv(f'snowflake_{looking_for.lower()}'))
 
-    # Insert a column with checkboxes for sending emails into HTML template
-    checkbox_html = '<input type="checkbox" name="checkbox{{ loop.index0 }}" class="email-checkbox">'
-    skills_output.insert(0, config['send_email'], checkbox_html)
-    
-    # If the table contains column with URL links, add HTML codes for hyperlinks
     try:
-        skills_output[config['profile']] = skills_output[config['profile']].apply(lambda x: f'<a href="{x}" target="_blank">{x}</a>') 
-    except:
-        pass
+        with stage('positions'):
+            position_index = open_positions_index(snapshot, looking_for, config, payload.get('positions'))
+
+        # Level codes and skills' occurrences of the volunteer / mentor (from the table, or from their skills)
+        if payload.get('email'):
+            rows = snapshot.data.find(config['out_cols']['default'][1], payload['email'])
+            if len(rows) == 0:
+                abort(404, description = f'Unknown {looking_for.lower()}: {payload["email"]}')
+            profile = PositionIndex.profile_of(snapshot.index, rows[0])
+        else:
+            profile = PositionIndex.profile_from_skills(snapshot.index, parse_skills(payload['skills'], config.skills_map))
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        abort(400, description = f'Invalid positions or skills: {e}')
 
-    # Redirect to the result table page with the result table and the last update date
-    return render_template('result.html',
-                           table = skills_output.to_html(index = False, escape = False),
-                           last_updated = last_updated)
+    # Scoring of the volunteer / mentor against all the positions at once
+    with stage('distance'):
+        positions, scores = position_index.rank(*profile, k = k)
+
+    return jsonify({'last_updated': last_updated_date(snapshot),
+                    'total': len(position_index),
+                    'positions': [{'name': position_index.names[i],
+                                   'score': float(score),
+                                   'skills': {config.skill_names[skill]: config['lvl_map'].get(props['level'], '')
+                                              for skill, props in position_index.skills_inputs[i].items()}}
+                                  for i, score in zip(positions, scores)]})
 
 
 
@@ -584,29 +819,47 @@ def new_page():
 
 
 
-# Download output table as Excel file
+# Download output table as Excel / CSV / Parquet file (format given by the 'format' parameter, Excel by default)
+    # The rows are formatted and written in chunks and the file is streamed to the browser
 @app.route('/download')
 def download():
 
-    # Object for in-memory streaming of binary I/O operations
-    output = BytesIO()
+    config = config_loader.get()
+    search_result = get_search_result()
 
-    # Writing the result table into the stream
-    with pd.ExcelWriter(output, engine = 'xlsxwriter') as writer:
-        skills_output_excel.to_excel(writer, sheet_name = 'SkillsMatching', index = False)
-    
-    # Resetting the stream position
-    output.seek(0)
-    
-    # Current datetime inserted into Excel file name
+    export_format = request.args.get('format', 'xlsx')
+
+    if not export_available(export_format):
+        abort(400, description = f'Unsupported export format: {export_format}')
+
+    # Whole result table sorted by score and additionaly by other columns (already ranked), formatted in chunks of rows
+    chunks = formatted_chunks(search_result['matches'],
+                              lambda chunk: format_rows(chunk, search_result, config),
+                              config['export']['chunk_rows'])
+
+    headers = {}
+
+    if export_format == 'xlsx':
+        # Excel file is written in the constant memory mode into a spooled temporary file first
+        output, headers['Content-Length'] = excel_stream(chunks, 'SkillsMatching', config['export']['spool_max_bytes'])
+    elif export_format == 'csv':
+        output = csv_stream(chunks)
+    else:
+        output = parquet_stream(chunks)
+
+    # Current datetime inserted into the file name
     current_datime = datetime.now(pytz.timezone('Europe/Prague')).strftime("%Y-%m-%d_%Hh%Mm")
 
+    mimetype, extension = EXPORT_FORMATS[export_format]
+
+    # HTTP header for local download and save the result table
+    headers["Content-disposition"] = f"attachment; filename = SkillsMatching_{current_datime}.{extension}"
+
     response = Response(
-        output,
-        # Media application type with binary data in Excel -> allows the web broswer to handle the result table
-        mimetype = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        # HTTP header for local download and save the result table
-        headers= {"Content-disposition": f"attachment; filename = SkillsMatching_{current_datime}.xlsx"}
+        stream_with_context(output),
+        # Media application type of the file -> allows the web broswer to handle the result table
+        mimetype = mimetype,
+        headers = headers
     )
 
     return response
@@ -618,6 +871,13 @@ def download():
 @app.route('/prep_email', methods=['POST'])
 def email():
 
+    import pandas as pd
+
+    config = config_loader.get()
+    search_result = get_search_result()
+    position_info = search_result['position_info']
+    body_email = search_result['body_email']
+
     # Retrieving the selected volunteers / mentors from the HTML page
     selected_users = pd.DataFrame(request.get_json())
 
@@ -0,0 +1,229 @@
+import os
+import re
+import sys
+import time
+import argparse
+
+import yaml
+
+
+# Output formats of the ranked matches (only the formats which can be streamed into a file)
+OUTPUT_FORMATS = ['csv', 'parquet']
+
+
+## Function for the file name of the position's matches (position's order and its name w/o special characters)
+def output_name(i, name, output_format):
+
+    return f'{i:03d}_{re.sub(r"[^0-9A-Za-z_-]+", "_", name).strip("_")}.{output_format}'
+
+
+## Function for writing the streamed chunks of bytes into the file (returns the number of bytes written)
+def write_stream(stream, path):
+
+    written = 0
+
+    try:
+        with open(path + '.tmp', 'wb') as f:
+            for data in stream:
+                f.write(data)
+                written += len(data)
+
+        # The file appears only when it is complete (e.g., for the next steps of the nightly job)
+        os.replace(path + '.tmp', path)
+    finally:
+        # No partial file is left behind if the stream fails
+        if os.path.exists(path + '.tmp'):
+            os.remove(path + '.tmp')
+
+    return written
+
+
+## Function for the snapshot of the volunteers' / mentors' table
+ # from the on-disk snapshot's directory, or from the configured data source (through the app's snapshot cache)
+def load_snapshot(app, looking_for, snapshot_dir = None, table_name = None):
+
+    from snapshot import load_snapshot as load_snapshot_dir
+
+    if snapshot_dir:
+        # The skills index must be built with the app's skills map
+        snapshot = load_snapshot_dir(snapshot_dir, skills = list(app.config.skills_map.values()))
+        if snapshot is None:
+            raise ValueError(f'{snapshot_dir}: the snapshot was stored by another version of the app')
+        return snapshot
+
+    table_name = table_name or os.getenv(f'snowflake_{looking_for}')
+    if not table_name:
+        raise ValueError(f'No table of the {looking_for}s, set --table or snowflake_{looking_for} in the .env file')
+
+    return app.snapshot_cache.refresh(table_name)
+
+
+## Function for scoring all the positions against the snapshot
+ # Returns the matched rows and their scores for each position (in the order of the positions)
+def score_positions(matchers, snapshot, workers, chunk_rows):
+
+    from matcher import parallel_matching
+
+    if not workers:
+        return [matcher.match(snapshot.index) for matcher in matchers]
+
+    # The worker processes memory-map the on-disk skills index of the snapshot (or its temporary copy)
+    index_dir = os.path.join(snapshot.path, 'index') if snapshot.path else None
+
+    return parallel_matching(matchers, snapshot.index, workers = workers, chunk_rows = chunk_rows, index_dir = index_dir)
+
+
+## Function for the formatted chunks of the position's ranked matches (the same rows and columns as the downloaded result table)
+ # Only the top k matches are materialized (all of them if k is not given)
+def ranked_chunks(app, snapshot, rows, scores, skills_input, looking_for, top_k_rows, chunk_rows):
+
+    from matcher import top_k
+    from skill_index import MatchedSkills
+
+    config = app.config
+
+    ranked = top_k(app.ranking_table(snapshot.data, rows, scores, looking_for, config),
+                   *app.sort_columns(looking_for, config), k = top_k_rows)
+
+    # The ranked rows are re-indexed to their positions in the returned rows
+    returned = rows[ranked.index.to_numpy()]
+    display = snapshot.data.subset(returned)
+    search = {'display': display, 'skills': MatchedSkills(snapshot.index, returned, skills_input.keys()),
+              'skills_input': skills_input, 'looking_for': looking_for}
+    integer_cols = display.integer_columns(config['out_cols'][looking_for])
+
+    return app.formatted_chunks(ranked.reset_index(drop = True),
+                                lambda chunk: app.format_result(app.shown_rows(chunk, search, config),
+                                                                skills_input, looking_for, integer_cols, config),
+                                chunk_rows)
+
+
+## Function for the chunks of the positions ranked for the volunteers / mentors with given emails (one chunk per volunteer / mentor)
+ # The volunteers / mentors not found in the snapshot have no rows (an empty chunk with the columns if none of them is found)
+def reverse_chunks(app, snapshot, position_index, emails, k):
+
+    import pandas as pd
+
+    name_col, email_col = app.config['out_cols']['default'][:2]
+    found = False
+
+    for email in emails:
+        rows = snapshot.data.find(email_col, email)
+
+        if len(rows) == 0:
+            print(f'  {email}: not found', file = sys.stderr)
+            continue
+
+        positions, scores = position_index.rank(*position_index.profile_of(snapshot.index, rows[0]), k = k)
+        found = True
+
+        yield pd.DataFrame({email_col: email,
+                            name_col: snapshot.data.column(name_col, rows[:1])[0],
+                            'Rank': range(1, len(positions) + 1),
+                            'Position': [position_index.names[i] for i in positions],
+                            'Score': scores})
+
+    if not found:
+        yield pd.DataFrame({email_col: pd.Series(dtype = object), name_col: pd.Series(dtype = object),
+                            'Rank': pd.Series(dtype = 'int64'), 'Position': pd.Series(dtype = object),
+                            'Score': pd.Series(dtype = 'float64')})
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description = 'Bulk matching of the positions against the volunteers / mentors '
+                                                   '(ranked matches of each position written as CSV / Parquet files)')
+    parser.add_argument('positions', help = 'YAML / JSON file of the positions and their required skills')
+    parser.add_argument('--output-dir', required = True, help = 'directory of the output files (one file per position)')
+    parser.add_argument('--format', choices = OUTPUT_FORMATS, default = 'csv')
+    parser.add_argument('--looking-for', choices = ['volunteer', 'mentor'], default = 'volunteer')
+    parser.add_argument('--snapshot', help = 'directory of an on-disk snapshot (otherwise the table is loaded from the data source)')
+    parser.add_argument('--data-source', help = 'data source (sqlite:///path, csv:///dir or snowflake), overrides the .env file')
+    parser.add_argument('--table', help = 'table of the volunteers / mentors (snowflake_volunteer / snowflake_mentor by default)')
+    parser.add_argument('--top-k', type = int, help = 'number of the written matches per position (all the matches by default)')
+    parser.add_argument('--workers', type = int, default = 0, help = 'number of processes of the parallel scoring (0 -> in process)')
+    parser.add_argument('--chunk-rows', type = int, default = 100000,
+                        help = 'candidates per task of the parallel scoring (larger positions are split)')
+    parser.add_argument('--related-skills', action = 'store_true', help = 'partial credit of the related skills (see related_skills in config.yaml)')
+    parser.add_argument('--reverse', nargs = '+', metavar = 'EMAIL',
+                        help = 'rank the positions for the volunteers / mentors with given emails instead (written into reverse.csv / .parquet)')
+    args = parser.parse_args()
+
+    # The data source is selected when the app is imported
+    if args.data_source:
+        os.environ['data_source'] = args.data_source
+
+    import app
+    from position_index import PositionIndex, read_positions
+
+    if not app.export_available(args.format):
+        parser.error(f'The {args.format} output requires pyarrow')
+
+    try:
+        positions = read_positions(args.positions, app.config.skills_map)
+    except (OSError, ValueError, AttributeError, yaml.YAMLError) as e:
+        parser.error(str(e))
+
+    started = time.perf_counter()
+
+    snapshot = load_snapshot(app, args.looking_for, args.snapshot, args.table)
+    loaded = time.perf_counter()
+
+    print(f'{snapshot.table_name} ({snapshot.timestamp}): {len(snapshot.index)} {args.looking_for}s, '
+          f'loaded in {loaded - started:.1f} s', file = sys.stderr)
+
+    # The reverse matching scores the exact skills only
+    matchers = [app.make_matcher(skills_input, args.looking_for, app.config, related_skills = args.related_skills and not args.reverse)
+                for _, skills_input in positions]
+    stream = app.csv_stream if args.format == 'csv' else app.parquet_stream
+    os.makedirs(args.output_dir, exist_ok = True)
+
+    # Reverse matching - the positions ranked for each of the volunteers / mentors
+    if args.reverse:
+        position_index = PositionIndex([name for name, _ in positions], matchers, snapshot.index)
+        indexed = time.perf_counter()
+
+        chunks = reverse_chunks(app, snapshot, position_index, args.reverse, args.top_k)
+        written_bytes = write_stream(stream(chunks), os.path.join(args.output_dir, f'reverse.{args.format}'))
+        finished = time.perf_counter()
+
+        print(f'Positions index: {len(position_index)} positions in {indexed - loaded:.2f} s, '
+              f'{len(args.reverse) / max(finished - indexed, 1e-9):.1f} {args.looking_for}s/s '
+              f'({written_bytes / 2 ** 20:.1f} MB written)', file = sys.stderr)
+        return
+
+    # Scoring of all the positions
+    matches = score_positions(matchers, snapshot, args.workers, args.chunk_rows)
+    scored = time.perf_counter()
+
+    candidates = sum(len(rows) for rows, _ in matches)
+
+    # Ranked matches of each position streamed into its file chunk by chunk
+    written_rows = written_bytes = 0
+
+    for i, ((name, skills_input), (rows, scores)) in enumerate(zip(positions, matches)):
+        chunks = ranked_chunks(app, snapshot, rows, scores, skills_input, args.looking_for,
+                               args.top_k, app.config['export']['chunk_rows'])
+        n_rows = min(len(rows), args.top_k) if args.top_k is not None else len(rows)
+
+        written_bytes += write_stream(stream(chunks), os.path.join(args.output_dir, output_name(i, name, args.format)))
+        written_rows += n_rows
+
+        print(f'  {name}: {len(rows)} matches, {n_rows} written', file = sys.stderr)
+
+    finished = time.perf_counter()
+
+    # Throughput of the scoring and of the whole run (incl. writing the files)
+    scoring_time = max(scored - loaded, 1e-9)
+    total_time = max(finished - loaded, 1e-9)
+
+    print(f'Scoring: {len(positions) / scoring_time:.1f} positions/s, {candidates / scoring_time:,.0f} candidates scored/s '
+          f'({candidates} candidates in {scoring_time:.2f} s)', file = sys.stderr)
+    print(f'Total: {len(positions) / total_time:.1f} positions/s, {written_rows} rows ({written_bytes / 2 ** 20:.1f} MB) '
+          f'written in {total_time:.2f} s', file = sys.stderr)
+
+
+
+# Running the bulk matching (e.g., as a nightly job): python cli.py positions.yaml --output-dir matches/
+if __name__ == '__main__':
+    main()
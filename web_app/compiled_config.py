@@ -0,0 +1,251 @@
+import os
+import json
+import threading
+
+import yaml
+
+from instrumentation import log_event
+
+
+# Skills' levels of the form and of the level distances (as skill_index.LEVELS, which is not imported to keep NumPy out of the app's start)
+LEVELS = ['junior', 'medior', 'senior', 'mentor']
+
+# Scoring backends (as matcher.BACKENDS)
+BACKENDS = ('pairwise', 'vectorized')
+
+# Keys of the configuration which the snapshots are built with (pulled and displayed columns, excluded rows, missing levels),
+# their changes require a restart as the snapshots are not rebuilt by the reload
+SNAPSHOT_KEYS = ['out_cols', 'other_skills', 'drop_rows', 'mapping_lvl_nan', 'timestamp']
+
+
+# Invalid configuration (config.yaml, skills map or email template)
+class ConfigError(ValueError):
+    pass
+
+
+## Function for the problems of the configuration (empty if it is valid)
+ # Only the parts used by the requests are checked, e.g., the columns, translations, sorting, levels and sizes
+def config_problems(config, skills_map, email_template):
+
+    problems = []
+
+    def check(condition, message):
+        if not condition:
+            problems.append(message)
+        return condition
+
+    required = ['input_dir', 'skills_map', 'email_template', 'positions_file', 'drop_rows', 'email_inputs', 'out_cols',
+                'mapping_lvl_nan', 'X_const', 'scoring_backend', 'level_distance', 'related_skills', 'lvl_map', 'timestamp',
+                'other_skills', 'last_email_sent', 'translate', 'on_project_now', 'sort', 'result_store', 'match_cache', 'export',
+                'batch_top_k', 'reverse_top_k', 'page_size', 'render_chunk_rows', 'render_buffer', 'profile', 'send_email',
+                'email', 'project_count', 'snapshot', 'instrumentation']
+    missing = [key for key in required if key not in config]
+
+    if not check(not missing, f'missing keys: {", ".join(missing)}'):
+        return problems
+
+    # Output columns, their translations and the sorting of the result table
+    out_cols = config['out_cols']
+    looking_fors = [looking_for for looking_for in out_cols if looking_for != 'default']
+
+    if check(isinstance(out_cols.get('default'), list) and len(out_cols['default']) >= 3 and looking_fors,
+             'out_cols: expected the default columns (name, email, ..., score) and the columns of the volunteers / mentors'):
+
+        for looking_for in looking_fors:
+            translate = config['translate'].get('default', {}) | config['translate'].get(looking_for, {})
+            translated = [translate.get(col, col) for col in out_cols['default'] + out_cols[looking_for]]
+            sort = config['sort'].get(looking_for) or {}
+
+            check(isinstance(out_cols[looking_for], list), f'out_cols.{looking_for}: expected a list of columns')
+            check(config['other_skills'] in out_cols[looking_for], f'out_cols.{looking_for}: missing {config["other_skills"]}')
+            check(looking_for in config['translate'], f'translate: missing {looking_for}')
+            check(sort.get('cols') and len(sort.get('cols')) == len(sort.get('ascending') or []),
+                  f'sort.{looking_for}: expected the columns and their orders (ascending) of the same length')
+            check(all(col in translated for col in sort.get('cols') or []),
+                  f'sort.{looking_for}: the columns must be the (translated) output columns')
+
+            for key in ('email', 'project_count'):
+                check(config[key] in translated, f'{key}: {config[key]} is not an output column of the {looking_for}s')
+
+    # Scoring
+    check(config['scoring_backend'] in BACKENDS, f'scoring_backend: expected one of {", ".join(BACKENDS)}')
+    check(isinstance(config['X_const'], (int, float)), 'X_const: expected a number')
+
+    level_distance = config['level_distance'] or {}
+    check(set(level_distance) == set(LEVELS + ['any'])
+          and all(len(row) == len(LEVELS) + 2 and all(isinstance(dist, (int, float)) or dist == 'X_const' for dist in row)
+                  for row in level_distance.values()),
+          f'level_distance: expected rows {LEVELS + ["any"]} with {len(LEVELS) + 2} numbers (or X_const) each')
+    check(set(config['lvl_map']) == set(LEVELS), f'lvl_map: expected the levels {LEVELS}')
+    check(0 <= config['related_skills'].get('min_similarity', -1) <= 1, 'related_skills.min_similarity: expected a number in 0-1')
+
+    # Sizes of the pages, chunks and results
+    for key in ('page_size', 'render_chunk_rows', 'render_buffer', 'batch_top_k', 'reverse_top_k'):
+        check(isinstance(config[key], int) and config[key] > 0, f'{key}: expected a positive integer')
+    check(isinstance(config['export'].get('chunk_rows'), int) and config['export']['chunk_rows'] > 0,
+          'export.chunk_rows: expected a positive integer')
+
+    # Skills map (names with diacritics -> columns' names) and the email template
+    check(isinstance(skills_map, dict) and skills_map and all(isinstance(v, str) for v in skills_map.values()),
+          f'{config["skills_map"]}: expected a mapping of the skills\' names to the columns\' names')
+    check(len(set(skills_map.values())) == len(skills_map), f'{config["skills_map"]}: duplicate columns\' names')
+
+    for key, placeholder in config['email_inputs'].items():
+        check(placeholder in email_template, f'{config["email_template"]}: missing the placeholder {placeholder} ({key})')
+
+    return problems
+
+
+# Class of the compiled configuration: validated config.yaml (as a dictionary) with the skills map, email template
+# and the lookup tables derived from them, built once and shared by all the requests
+    # e.g., the renaming of the skills' levels and the translations of the output columns are not rebuilt per request
+class CompiledConfig(dict):
+    def __init__(self,
+                 config, # Configuration (config.yaml)
+                 skills_map, # Skills' names with diacritics -> columns' names (skills_map.json)
+                 email_template # Text of the email template with the position's placeholders
+                 ):
+
+        problems = config_problems(config, skills_map, email_template)
+        if problems:
+            raise ConfigError('Invalid configuration: ' + '; '.join(problems))
+
+        super().__init__(config)
+
+        self.skills_map = skills_map
+        self.email_template = email_template
+
+        # Columns' names -> skills' names with diacritics, and the same for the skills' level columns
+        self.skill_names = {v: k for k, v in skills_map.items()}
+        self.level_names = {f'{v}_level': k for k, v in skills_map.items()}
+
+        looking_fors = [looking_for for looking_for in config['out_cols'] if looking_for != 'default']
+
+        # Translations of the output columns (English -> Czech) of the volunteers / mentors
+        self.translate = {looking_for: config['translate']['default'] | config['translate'][looking_for] for looking_for in looking_fors}
+
+        # Sorting columns (English columns' names before translation) and their orders of the result table
+        self.sort_columns = {}
+        for looking_for in looking_fors:
+            translated = {v: k for k, v in self.translate[looking_for].items()}
+            self.sort_columns[looking_for] = ([translated.get(col, col) for col in config['sort'][looking_for]['cols']],
+                                              config['sort'][looking_for]['ascending'])
+
+        # Scored output columns of the volunteers / mentors (the other skills are added only to the displayed rows)
+        self.output_cols = {looking_for: [col for col in config['out_cols'][looking_for] if col != config['other_skills']]
+                            for looking_for in looking_fors}
+
+        # Columns of the volunteers' / mentors' tables used by the app (output columns, skills and their levels,
+        # timestamp and the column of the excluded rows), the other columns are not pulled
+        self.required_columns = ([col for cols in config['out_cols'].values() for col in cols]
+                                 + [col for skill in skills_map.values() for col in (skill, f'{skill}_level')]
+                                 + [config['timestamp'], config['drop_rows']['col']])
+
+        # Level distances with the constant penalizing the missing skills
+        self.level_distance = {row: [config['X_const'] if dist == 'X_const' else dist for dist in dists]
+                               for row, dists in config['level_distance'].items()}
+
+
+    # Email template with the position's name, description and link
+    def email_body(self, position_info):
+
+        body_email = self.email_template
+
+        for key, placeholder in self['email_inputs'].items():
+            body_email = body_email.replace(placeholder, position_info[key] or '')
+
+        return body_email
+
+
+## Function for the input directory of the skills map and the email template (relative to the app's directory)
+def input_dir(config_path, config):
+
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(config_path))), config['input_dir'])
+
+
+## Function for compiling the configuration from the files (config.yaml, the skills map and the email template in its input directory)
+def read_config(config_path):
+
+    with open(config_path, 'r', encoding = 'utf-8') as f:
+        config = yaml.safe_load(f)
+
+    inputs = input_dir(config_path, config)
+
+    with open(os.path.join(inputs, config['skills_map']), 'r', encoding = 'utf-8') as f:
+        skills_map = json.load(f)
+
+    with open(os.path.join(inputs, config['email_template']), 'r', encoding = 'utf-8') as f:
+        email_template = f.read()
+
+    return CompiledConfig(config, skills_map, email_template)
+
+
+# Class of the compiled configuration reloaded when its files change (checked by their modification times)
+    # The configuration is compiled at the start, so a broken configuration fails the app's start instead of the requests
+    # A broken configuration changed later is logged and the previous configuration is kept
+    # The skills' columns and the snapshots' keys cannot change while running (the snapshots are built with them),
+    # such changes require a restart
+class ConfigLoader:
+    def __init__(self,
+                 config_path # Path of config.yaml
+                 ):
+
+        self.config_path = config_path
+        self.lock = threading.Lock()
+        self.config = read_config(config_path)
+        self.mtimes = self._mtimes()
+
+
+    # Paths of the configuration's files
+    def _paths(self):
+
+        inputs = input_dir(self.config_path, self.config)
+
+        return [self.config_path,
+                os.path.join(inputs, self.config['skills_map']),
+                os.path.join(inputs, self.config['email_template'])]
+
+
+    # Modification times of the configuration's files (None if a file is missing)
+    def _mtimes(self):
+
+        mtimes = []
+
+        for path in self._paths():
+            try:
+                mtimes.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                mtimes.append(None)
+
+        return mtimes
+
+
+    # Current compiled configuration (reloaded if any of its files changed)
+    def get(self):
+
+        if self._mtimes() == self.mtimes:
+            return self.config
+
+        with self.lock:
+            mtimes = self._mtimes()
+
+            if mtimes != self.mtimes:
+                try:
+                    config = read_config(self.config_path)
+
+                    if list(config.skills_map.values()) != list(self.config.skills_map.values()):
+                        raise ConfigError(f'{config["skills_map"]}: the skills\' columns changed, restart the app to apply it')
+
+                    changed = [key for key in SNAPSHOT_KEYS if config[key] != self.config[key]]
+                    if changed:
+                        raise ConfigError(f'{", ".join(changed)} changed, restart the app to apply it')
+
+                    self.config = config
+                    log_event('config_reloaded', path = self.config_path)
+                except (OSError, KeyError, TypeError, AttributeError, ValueError, yaml.YAMLError) as e:
+                    log_event('config_reload_failed', path = self.config_path, error = str(e))
+
+                # The failed changes are not retried until the files change again
+                self.mtimes = mtimes
+
+        return self.config
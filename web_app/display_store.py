@@ -0,0 +1,237 @@
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+
+# Text column stored as one UTF-8 byte buffer with the offsets of the values (no Python string object per value)
+    # The values are decoded only for the requested rows
+class TextColumn:
+    def __init__(self,
+                 buffer, # UTF-8 bytes of all the values (uint8 array)
+                 offsets, # Offsets of the values in the buffer (number of values + 1)
+                 missing = None # Optional mask of the missing values (None / NaN)
+                 ):
+
+        self.buffer = buffer
+        self.offsets = offsets
+        self.missing = missing
+
+
+    @classmethod
+    def from_values(cls, values):
+
+        missing = np.asarray(pd.isna(values), dtype = bool)
+        encoded = [b'' if m else v.encode('utf-8') for v, m in zip(values, missing)]
+
+        offsets = np.zeros(len(encoded) + 1, dtype = np.int64)
+        np.cumsum([len(v) for v in encoded], out = offsets[1:])
+
+        return cls(np.frombuffer(b''.join(encoded), dtype = np.uint8), offsets, missing if missing.any() else None)
+
+
+    def __len__(self):
+
+        return len(self.offsets) - 1
+
+
+    # Decoded values of given rows (their bytes are gathered first, then decoded one by one)
+    def take(self, rows):
+
+        column = self.subset(rows)
+        buffer, offsets = column.buffer.tobytes(), column.offsets.tolist()
+
+        values = np.empty(len(rows), dtype = object)
+        values[:] = [buffer[start:end].decode('utf-8') for start, end in zip(offsets[:-1], offsets[1:])]
+
+        if column.missing is not None:
+            values[column.missing] = None
+
+        return values
+
+
+    # Column of given rows only (still encoded), the bytes of the rows are gathered at once
+    def subset(self, rows):
+
+        starts, lengths = self.offsets[rows], self.offsets[rows + 1] - self.offsets[rows]
+
+        offsets = np.zeros(len(rows) + 1, dtype = np.int64)
+        np.cumsum(lengths, out = offsets[1:])
+
+        gather = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1], dtype = np.int64)
+
+        return TextColumn(self.buffer[gather], offsets, None if self.missing is None else self.missing[rows])
+
+
+    # Rows having given value (the values of the same length are compared as bytes, nothing is decoded)
+    def find(self, value):
+
+        encoded = np.frombuffer(value.encode('utf-8'), dtype = np.uint8)
+        rows = np.flatnonzero(np.diff(self.offsets) == len(encoded))
+
+        if self.missing is not None:
+            rows = rows[~self.missing[rows]]
+
+        if len(rows) == 0 or len(encoded) == 0:
+            return rows
+
+        values = self.subset(rows).buffer.reshape(len(rows), len(encoded))
+
+        return rows[(values == encoded).all(axis = 1)]
+
+
+    def __sizeof__(self):
+
+        return self.buffer.nbytes + self.offsets.nbytes + (0 if self.missing is None else self.missing.nbytes)
+
+
+
+## Function for the mask of the values which can be displayed as integers (missing values, empty strings and whole numbers)
+def integer_mask(values):
+
+    values = pd.Series(values, dtype = object).replace({'': np.nan})
+    numbers = pd.to_numeric(values, errors = 'coerce')
+
+    return (values.isna() | (numbers.notna() & (numbers % 1 == 0))).to_numpy()
+
+
+
+# Display-only columns of the volunteers / mentors (names, emails, free texts, ...) kept apart from the scoring data
+    # The text columns are stored encoded and the values are materialized only for the shown rows
+    # It can be saved as NumPy files and loaded memory-mapped (the processes on one host share the same pages)
+class DisplayStore:
+    def __init__(self,
+                 columns, # Column name -> TextColumn (text columns) or numpy array (other columns)
+                 integer_masks # Column name -> mask of the rows which can be displayed as integers
+                 ):
+
+        self._columns = columns
+        self.integer_masks = integer_masks
+        self.columns = list(columns)
+
+
+    @classmethod
+    def from_frame(cls, df, columns):
+
+        data = {}
+        integer_masks = {}
+
+        for col in columns:
+            if col not in df.columns:
+                continue
+
+            values = df[col].to_numpy()
+            integer_masks[col] = integer_mask(values)
+
+            # Columns of strings only (and missing values) are encoded, the other columns are kept as they are
+            if values.dtype == object and all(isinstance(v, str) for v in values[~pd.isna(values)]):
+                data[col] = TextColumn.from_values(values)
+            else:
+                data[col] = values
+
+        return cls(data, integer_masks)
+
+
+    def __len__(self):
+
+        return len(next(iter(self._columns.values()))) if self._columns else 0
+
+
+    # Saving the store into the directory (one .npy file per array, the columns' kinds as JSON)
+        # The columns of Python objects other than strings are pickled (they are not memory-mapped when loaded)
+    def save(self, directory):
+
+        os.makedirs(directory, exist_ok = True)
+        kinds = {}
+
+        for i, (col, values) in enumerate(self._columns.items()):
+            path = os.path.join(directory, f'{i}')
+
+            if isinstance(values, TextColumn):
+                kinds[col] = 'text'
+                np.save(f'{path}_buffer.npy', values.buffer)
+                np.save(f'{path}_offsets.npy', values.offsets)
+                if values.missing is not None:
+                    np.save(f'{path}_missing.npy', values.missing)
+            else:
+                kinds[col] = 'object' if values.dtype == object else 'array'
+                np.save(f'{path}_values.npy', values, allow_pickle = values.dtype == object)
+
+            np.save(f'{path}_integer.npy', self.integer_masks[col])
+
+        with open(os.path.join(directory, 'columns.json'), 'w', encoding = 'utf-8') as f:
+            json.dump(list(kinds.items()), f, ensure_ascii = False)
+
+
+    # Store saved in the directory, its arrays are memory-mapped (read-only)
+    @classmethod
+    def load(cls, directory):
+
+        with open(os.path.join(directory, 'columns.json'), 'r', encoding = 'utf-8') as f:
+            kinds = json.load(f)
+
+        columns = {}
+        integer_masks = {}
+
+        for i, (col, kind) in enumerate(kinds):
+            path = os.path.join(directory, f'{i}')
+
+            if kind == 'text':
+                missing = f'{path}_missing.npy'
+                columns[col] = TextColumn(np.load(f'{path}_buffer.npy', mmap_mode = 'r'),
+                                          np.load(f'{path}_offsets.npy', mmap_mode = 'r'),
+                                          np.load(missing, mmap_mode = 'r') if os.path.exists(missing) else None)
+            elif kind == 'object':
+                columns[col] = np.load(f'{path}_values.npy', allow_pickle = True)
+            else:
+                columns[col] = np.load(f'{path}_values.npy', mmap_mode = 'r')
+
+            integer_masks[col] = np.load(f'{path}_integer.npy', mmap_mode = 'r')
+
+        return cls(columns, integer_masks)
+
+
+    # Values of the column for given rows (all the rows if not given)
+    def column(self, name, rows = None):
+
+        values = self._columns[name]
+        rows = np.arange(len(self)) if rows is None else np.asarray(rows, dtype = np.intp)
+
+        return values.take(rows) if isinstance(values, TextColumn) else values[rows]
+
+
+    # Data frame of given rows (all the rows if not given) and columns (all the columns if not given)
+    def take(self, rows = None, columns = None):
+
+        return pd.DataFrame({col: self.column(col, rows) for col in (self.columns if columns is None else columns)})
+
+
+    # Rows having given value in the column (e.g., the volunteer / mentor by their email)
+    def find(self, name, value):
+
+        values = self._columns[name]
+
+        return values.find(value) if isinstance(values, TextColumn) else np.flatnonzero(values == value)
+
+
+    # Store of given rows only
+    def subset(self, rows):
+
+        rows = np.asarray(rows, dtype = np.intp)
+
+        return DisplayStore({col: values.subset(rows) if isinstance(values, TextColumn) else values[rows]
+                             for col, values in self._columns.items()},
+                            {col: mask[rows] for col, mask in self.integer_masks.items()})
+
+
+    # Columns which can be displayed as integers for all the rows
+    def integer_columns(self, columns):
+
+        return [col for col in columns if col in self.integer_masks and self.integer_masks[col].all()]
+
+
+    def __sizeof__(self):
+
+        return sum(values.__sizeof__() if isinstance(values, TextColumn) else values.nbytes for values in self._columns.values()) \
+               + sum(mask.nbytes for mask in self.integer_masks.values())
@@ -0,0 +1,160 @@
+import tempfile
+
+
+# Number of bytes of the file sent in one chunk of the response
+CHUNK_BYTES = 64 * 1024
+
+# Export formats: media type and file extension
+EXPORT_FORMATS = {
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+## Function for formatting the sorted result table in chunks of rows
+ # Only one chunk of the formatted rows is held in memory at a time (the empty table still yields its header)
+def formatted_chunks(ranked, format_chunk, chunk_rows):
+
+    for start in range(0, max(len(ranked), 1), chunk_rows):
+        yield format_chunk(ranked.iloc[start:start + chunk_rows])
+
+
+## Function for the values of the rows without missing values (None instead of NaN / NA)
+def _rows(chunk):
+
+    return chunk.astype(object).where(chunk.notna(), None).itertuples(index = False, name = None)
+
+
+## Function for streaming the file in chunks of bytes (the file is closed afterwards)
+def _stream_file(file):
+
+    try:
+        file.seek(0)
+        for data in iter(lambda: file.read(CHUNK_BYTES), b''):
+            yield data
+    finally:
+        file.close()
+
+
+## Function for writing the result table into the Excel file (xlsxwriter's constant memory mode)
+ # The file is kept in memory up to the given number of bytes, larger files are spooled into a temporary file
+ # Returns the stream of the file's bytes and its size
+def excel_stream(chunks, sheet_name, spool_max_bytes):
+
+    import xlsxwriter
+
+    output = tempfile.SpooledTemporaryFile(max_size = spool_max_bytes)
+
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+    worksheet = workbook.add_worksheet(sheet_name)
+    # The same header style as in pandas' Excel output
+    header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+
+    row = 0
+    for chunk in chunks:
+        # Header (the rows must be written in order in the constant memory mode)
+        if row == 0:
+            worksheet.write_row(row, 0, list(chunk.columns), header_format)
+            row += 1
+
+        for values in _rows(chunk):
+            worksheet.write_row(row, 0, values)
+            row += 1
+
+    workbook.close()
+
+    size = output.tell()
+
+    return _stream_file(output), size
+
+
+## Function for streaming the result table as CSV (UTF-8 with BOM, so Excel displays the diacritics correctly)
+def csv_stream(chunks):
+
+    yield '\ufeff'.encode('utf-8')
+
+    for i, chunk in enumerate(chunks):
+        yield chunk.to_csv(index = False, header = (i == 0)).encode('utf-8')
+
+
+# Write-only sink collecting the bytes written by the Parquet writer until they are taken
+class _ChunkSink:
+    def __init__(self):
+
+        self.buffer = bytearray()
+        self.position = 0
+        self.closed = False
+
+
+    def write(self, data):
+
+        self.buffer += data
+        self.position += len(data)
+
+        return len(data)
+
+
+    def tell(self):
+
+        return self.position
+
+
+    def flush(self):
+
+        pass
+
+
+    def close(self):
+
+        self.closed = True
+
+
+    def take(self):
+
+        data = bytes(self.buffer)
+        self.buffer.clear()
+
+        return data
+
+
+
+## Function for streaming the result table as Parquet (one row group per chunk, requires pyarrow)
+def parquet_stream(chunks):
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _ChunkSink()
+    writer = None
+
+    for chunk in chunks:
+        # Schema is given by the first chunk (all the values of the object columns are stored as strings)
+        chunk = chunk.astype({col: 'string' for col in chunk.columns if chunk[col].dtype == object})
+
+        if writer is None:
+            schema = pa.Schema.from_pandas(chunk, preserve_index = False)
+            writer = pq.ParquetWriter(sink, schema)
+
+        writer.write_table(pa.Table.from_pandas(chunk, schema = schema, preserve_index = False))
+        yield sink.take()
+
+    # No chunks - the file contains an empty table without columns
+    if writer is None:
+        writer = pq.ParquetWriter(sink, pa.schema([]))
+
+    writer.close()
+    yield sink.take()
+
+
+
+## Function for checking whether the export format is available (Parquet requires optional pyarrow package)
+def export_available(export_format):
+
+    if export_format == 'parquet':
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            return False
+
+    return export_format in EXPORT_FORMATS
@@ -0,0 +1,215 @@
+import os
+import re
+import sys
+import json
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+
+# Logger of the structured log lines (one JSON line per request printed to stdout, i.e., to CloudWatch on Lambda)
+logger = logging.getLogger('skill_matcher')
+logger.setLevel(logging.INFO)
+logger.propagate = False
+
+if not logger.handlers:
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+
+# Stage timings of the current request (None outside of the instrumented requests, i.e., the stages are not recorded)
+_timings = contextvars.ContextVar('timings', default = None)
+
+
+# Durations of the request's stages (the repeated stages are summed up, e.g., scoring of several positions)
+    # and the request's counters (e.g., cache hits / misses)
+class RequestTimings:
+    def __init__(self):
+
+        self.start = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+
+
+    def add(self, name, seconds):
+
+        self.stages[name] = self.stages.get(name, 0) + seconds
+
+
+    def count(self, name, n = 1):
+
+        self.counters[name] = self.counters.get(name, 0) + n
+
+
+    # Number of milliseconds since the start of the request
+    def total_ms(self):
+
+        return (time.perf_counter() - self.start) * 1000
+
+
+    # Value of the Server-Timing header (stages in the order of their first occurrence, the total time and the counters)
+    def server_timing(self):
+
+        return ', '.join([f'{name};dur={seconds * 1000:.1f}' for name, seconds in self.stages.items()]
+                         + [f'total;dur={self.total_ms():.1f}']
+                         + [f'{name};desc="{n}"' for name, n in self.counters.items()])
+
+
+## Function for starting the recording of the stage timings of the current request
+def begin_request():
+
+    timings = RequestTimings()
+    _timings.set(timings)
+
+    return timings
+
+
+## Function for stopping the recording of the stage timings of the current request
+def end_request():
+
+    _timings.set(None)
+
+
+## Function for the stage timings of the current request (None if they are not recorded)
+def current_timings():
+
+    return _timings.get()
+
+
+## Context manager measuring the duration of the stage of the current request (no-op if the timings are not recorded)
+ # e.g., with stage('cosine'): ...
+@contextmanager
+def stage(name):
+
+    timings = _timings.get()
+
+    if timings is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
+
+
+## Function for counting the event of the current request, e.g., count('match_cache_hit') (no-op if the timings are not recorded)
+def count(name, n = 1):
+
+    timings = _timings.get()
+
+    if timings is not None:
+        timings.count(name, n)
+
+
+## Function for the maximum resident set size of the process in MB (None if not available, e.g., on Windows)
+def max_rss_mb():
+
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    # Kilobytes on Linux (e.g., on Lambda)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+## Function for logging the event (e.g., the background refresh of a snapshot) as one JSON line
+def log_event(event, **fields):
+
+    logger.info(json.dumps({'event': event, **fields}))
+
+
+## Function for logging the request's stage timings as one JSON line
+def log_request(method, path, status, timings, **extra):
+
+    log_event('request', method = method, path = path, status = status,
+              total_ms = round(timings.total_ms(), 1),
+              stages_ms = {name: round(seconds * 1000, 1) for name, seconds in timings.stages.items()},
+              counters = timings.counters,
+              max_rss_mb = max_rss_mb(),
+              **extra)
+
+
+
+# Opt-in profiling of the requests (cProfile statistics and tracemalloc snapshot dumped into a local directory)
+    # Only one request is profiled at a time (the others are not profiled), as tracemalloc traces the whole process
+class RequestProfiler:
+    def __init__(self,
+                 directory, # Directory of the dumped profiles
+                 cpu = True, # cProfile statistics of the request (*.prof, e.g., for snakeviz or pstats)
+                 memory = False # tracemalloc snapshot of the request (*.tracemalloc) and its peak memory
+                 ):
+
+        self.directory = directory
+        self.cpu = cpu
+        self.memory = memory
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+
+    # Starting the profiling of the request (False if another request is being profiled)
+    def start(self):
+
+        if not self._lock.acquire(blocking = False):
+            return False
+
+        if self.memory:
+            import tracemalloc
+            tracemalloc.start()
+
+        if self.cpu:
+            import cProfile
+            self._local.profile = cProfile.Profile()
+            self._local.profile.enable()
+
+        self._local.active = True
+
+        return True
+
+
+    # Stopping the profiling of the request and dumping the profiles
+        # Returns the paths of the dumped files and the peak traced memory in MB (if traced)
+    def stop(self, path):
+
+        if not getattr(self._local, 'active', False):
+            return {}
+
+        self._local.active = False
+        result = {}
+
+        name = os.path.join(self.directory,
+                            f"{time.strftime('%Y%m%d-%H%M%S')}_{re.sub(r'[^0-9A-Za-z]+', '_', path).strip('_') or 'root'}_{os.getpid()}")
+
+        try:
+            os.makedirs(self.directory, exist_ok = True)
+
+            if self.cpu:
+                self._local.profile.disable()
+                self._local.profile.dump_stats(f'{name}.prof')
+                result['profile'] = f'{name}.prof'
+
+            if self.memory:
+                import tracemalloc
+                result['peak_traced_mb'] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+                tracemalloc.take_snapshot().dump(f'{name}.tracemalloc')
+                result['tracemalloc'] = f'{name}.tracemalloc'
+
+        # Profiling must never break the request
+        except OSError:
+            pass
+
+        finally:
+            if self.cpu:
+                self._local.profile.disable()
+                self._local.profile = None
+            if self.memory:
+                import tracemalloc
+                tracemalloc.stop()
+            self._lock.release()
+
+        return result
@@ -0,0 +1,106 @@
+import threading
+from collections import OrderedDict
+
+from instrumentation import count
+
+
+## Function for the canonical form of the required skills (sorted skills with their levels and weights)
+ # The same skills given in a different order of the form's fields give the same search
+def canonical_skills(skills_input):
+
+    return tuple(sorted((skill, (props.get('level') or '').lower(), float(props.get('weight', 1.0)))
+                        for skill, props in skills_input.items()))
+
+
+
+# LRU cache of the scored matches keyed by the normalized search, the volunteers / mentors and the snapshot version
+    # The least recently used matches are evicted when the byte budget is exceeded
+    # The matches of a table's previous snapshots are dropped as soon as its new snapshot is used
+class MatchCache:
+    def __init__(self,
+                 max_bytes # Byte budget of all the cached matches (0 -> no caching)
+                 ):
+
+        self.max_bytes = max_bytes
+
+        # Key -> (size, matches) in the order of the last usage
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        # Latest snapshot version (timestamp) of each table
+        self._versions = {}
+
+        self.hits = 0
+        self.misses = 0
+
+
+    # Key of the search against given snapshot
+        # The scoring settings (backend, level distances, related skills) are part of the key, so the changed settings are never served stale matches
+    @staticmethod
+    def key(skills_input, looking_for, snapshot, matcher):
+
+        return (canonical_skills(skills_input), looking_for.lower(), snapshot.table_name, str(snapshot.timestamp),
+                matcher.backend, matcher.distance_table.tobytes(), matcher.related_skills)
+
+
+    def _evict(self, key):
+
+        size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+
+    # Dropping the matches of the table's previous snapshots (called with the lock held)
+    def _invalidate(self, table_name, timestamp):
+
+        if self._versions.get(table_name) == timestamp:
+            return
+
+        self._versions[table_name] = timestamp
+
+        for key in [key for key in self._entries if key[2] == table_name and key[3] != timestamp]:
+            self._evict(key)
+
+
+    # Cached matches of given key (None if not cached), counted as the hit / miss of the request
+    def get(self, key):
+
+        with self._lock:
+            self._invalidate(key[2], key[3])
+
+            if key not in self._entries:
+                self.misses += 1
+                count('match_cache_miss')
+                return None
+
+            self.hits += 1
+            count('match_cache_hit')
+            self._entries.move_to_end(key)
+
+            return self._entries[key][1]
+
+
+    # Caching the matches of given key (the matches larger than the byte budget are not cached)
+    def put(self, key, matches, size):
+
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            self._invalidate(key[2], key[3])
+
+            if key in self._entries:
+                self._evict(key)
+
+            self._entries[key] = (size, matches)
+            self._bytes += size
+
+            while self._bytes > self.max_bytes:
+                self._evict(next(iter(self._entries)))
+
+
+    # Cumulative statistics of the cache (e.g., for the structured log lines)
+    def stats(self):
+
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries), 'bytes': self._bytes}
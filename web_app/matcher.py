@@ -0,0 +1,487 @@
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from skill_index import SkillIndex, LEVELS
+from instrumentation import stage
+
+
+# Scoring backends of the SkillsMatcher:
+    # 'pairwise' - all-pairs similarity / distance matrices of the baseline and the volunteers/mentors (reading only their 1st row)
+    # 'vectorized' - one-to-many similarities / distances of the baseline vs. the volunteers/mentors (identical scores, O(N) instead of O(N^2))
+BACKENDS = ('pairwise', 'vectorized')
+
+
+# Default distances of the volunteers'/mentors' skill levels (columns) from the required skill level (rows)
+    # Columns: junior, medior, senior, mentor, N/A level (non-missing skill with missing level), X (missing skill and level)
+    # 'any' row is used if the skill level is not required, 'X_const' stands for the constant penalizing missing skills
+LEVEL_DISTANCE = {
+    'junior': [0, 0.25, 0.5, 0.75, 1, 'X_const'],
+    'medior': [0.5, 0, 0.25, 0.75, 1, 'X_const'],
+    'senior': [0.75, 0.5, 0, 0.25, 1, 'X_const'],
+    'mentor': [0.75, 0.5, 0.25, 0, 1, 'X_const'],
+    'any': [0, 0, 0, 0, 0, 'X_const'],
+}
+
+
+## Function for building the lookup table of the level distances (required levels x level codes of the skills index)
+def level_distance_table(level_distance, X_const):
+
+    rows = LEVELS + ['any']
+
+    if set(level_distance) != set(rows) or any(len(level_distance[row]) != len(LEVELS) + 2 for row in rows):
+        raise ValueError(f'Level distances must have rows {rows} with {len(LEVELS) + 2} values each')
+
+    return np.array([[X_const if dist == 'X_const' else dist for dist in level_distance[row]] for row in rows],
+                    dtype = np.double)
+
+
+## Function for cosine similarity of the baseline vector vs. all the rows of the matrix
+ # Rows with zero norm have zero similarity (as in sklearn's cosine_similarity)
+def cosine_one_to_many(baseline, matrix):
+
+    norms = np.linalg.norm(matrix, axis = 1) * np.linalg.norm(baseline)
+    norms[norms == 0] = 1
+
+    return (matrix @ baseline) / norms
+
+
+## Function for cosine similarities of all pairs of the matrix's rows (as in sklearn's cosine_similarity)
+def cosine_pairwise(matrix):
+
+    norms = np.linalg.norm(matrix, axis = 1)
+    norms[norms == 0] = 1
+    normalized = matrix / norms[:, None]
+
+    return normalized @ normalized.T
+
+
+## Function for the inverse of the Mahalanobis distances' metric computed once for the whole matrix (as in scipy's pdist)
+ # Raises an error if the covariance matrix is singular, i.e., its inverse cannot be defined
+def mahalanobis_inverse(matrix):
+
+    # The covariance matrix is singular if there is not more observations than the dimensions
+    if matrix.shape[0] <= matrix.shape[1]:
+        raise ValueError('The number of observations is too small; the covariance matrix is singular.')
+
+    return np.linalg.inv(np.atleast_2d(np.cov(matrix.astype(np.double).T))).T
+
+
+## Function for the distances of the baseline vector vs. all the rows of the matrix
+def distances_one_to_many(baseline, matrix, metric, VI = None):
+
+    diff = matrix.astype(np.double) - baseline.astype(np.double)
+
+    if metric == 'euclidean':
+        return np.sqrt(np.einsum('ij,ij->i', diff, diff))
+
+    elif metric == 'cityblock':
+        return np.abs(diff).sum(axis = 1)
+
+    elif metric == 'mahalanobis':
+        return np.sqrt(np.einsum('ij,jk,ik->i', diff, VI, diff))
+
+    else:
+        raise ValueError(f'Unknown metric: {metric}')
+
+
+# Class for skills matching scoring
+class SkillsMatcher:
+    def __init__(self,
+                 skills_input, #Input from the form (skills' names, levels and weights)
+                 default_cols, # Default columns in the output table
+                 output_cols, # Additional output columns (for volunteers / mentors)
+                 X_const, # Constant variable for penalizing missing skills
+                 skill_y_lvl_n_name, # Indicator for non-missing skill with missing level
+                 skill_n_lvl_n_name, # Indicator for missing skill and missing level
+                 backend = 'vectorized', # Scoring backend ('pairwise' / 'vectorized')
+                 level_distance = None, # Distances of the skill levels from the required level (default LEVEL_DISTANCE)
+                 related_skills = None # Minimal similarity of the related skills giving partial credit for the missing input skills (None -> exact skills only)
+                 ):
+
+        if backend not in BACKENDS:
+            raise ValueError(f'Unknown scoring backend: {backend}')
+
+        # List of skills names'
+        self.input_skills = list(skills_input.keys())
+        # Dictionary of skills names, levels and weights
+        self.input_skills_levels = skills_input
+        # Output columns in the result table
+        self.display_columns = default_cols + [f'{i}_level' for i in self.input_skills_levels.keys()] + output_cols
+        # Scoring column name (Assuming its in the last position of the list)
+        self.scoring_name = default_cols[-1]
+         # Indicator for non-missing skill with missing level
+        self.skill_y_lvl_n_name = skill_y_lvl_n_name
+        # Indicator for missing skill and missing level
+        self.skill_n_lvl_n_name = skill_n_lvl_n_name
+        # Constant variable for penalizing missing skills
+        self.X_const = X_const
+        # Scoring backend
+        self.backend = backend
+        # Lookup table of the level distances (required levels x level codes)
+        self.distance_table = level_distance_table(level_distance or LEVEL_DISTANCE, X_const)
+        # Minimal similarity of the related skills (partial credit for the missing input skills)
+        self.related_skills = related_skills
+        
+        # 0-1 matrix of baseline and the volunteers/mentors (w.r.t. skills' occurrences)
+        self.indicator_skills_matrix = None
+        # Matrix of baseline and the volunteers/mentors (w.r.t. skills' levels and weights)
+        self.lvl_skills_matrix = None
+        # Inverses of distances of baseline vs. the volunteers/mentors
+        self.inv_dist_scores = None
+        # Rows of the skills index of the matched volunteers/mentors (in the order of the result table)
+        self.matched_rows = None
+        
+
+
+    # Scoring of the skills' occurrences - cosine similarity of the baseline vs. the volunteers/mentors (all the rows of the skills index)
+        # Only the input skills' columns are unpacked from the skills index, the volunteers' / mentors' table is not copied
+    def cosine_scores(self, skill_index):
+
+        # Baseline vector for cosine similarity (based on the input skills)
+        baseline = np.ones((1, len(self.input_skills)))
+
+        # 0-1 matrix of baseline and the volunteers/mentors (w.r.t. skills' occurrences)
+        self.indicator_skills_matrix = np.vstack((baseline, skill_index.indicator_of(self.input_skills)))
+
+        if self.backend == 'pairwise':
+            # Similarity based on cosine similarity
+                # 1st row indicates the cosine scores for the baseline vector with others starting from 2nd position
+                # i.e., excluding the score of the baseline with itself
+            return cosine_pairwise(self.indicator_skills_matrix)[0, 1:]
+
+        # Cosine scores of the baseline vector (1st row) directly vs. the others
+        return cosine_one_to_many(self.indicator_skills_matrix[0], self.indicator_skills_matrix[1:])
+
+
+
+    # Inverses of the average Euclidean, Manhattan and Mahalanobis distances of the baseline (1st row) vs. the volunteers/mentors
+        # Mahalanobis distance is omitted if its covariance matrix is singular
+    def distance_scores(self, lvl_skills_matrix):
+
+        # Calcuation of inverse of the distance metrics:
+            # Euclidean, Manhattan and Mahalanobis
+            # Absolute (cumulative) distances normed by the number of skills -> average distances
+            # Inverse distance -> similarity score: 1 / (avg_dist + 1) --> zero distance --> 100% score
+        if self.backend == 'pairwise':
+            # SciPy is imported only by the pairwise backend
+            from scipy.spatial import distance
+
+            # All-pairs distance matrices, only their 1st row is used
+            distances = lambda metric: distance.squareform(distance.pdist(lvl_skills_matrix, metric = metric))[0, 1:]
+        else:
+            # Distances of the baseline directly vs. the others
+                # The inverse of the Mahalanobis covariance matrix is computed only once (if requested)
+            distances = lambda metric: distances_one_to_many(lvl_skills_matrix[0], lvl_skills_matrix[1:], metric,
+                                                             mahalanobis_inverse(lvl_skills_matrix) if metric == 'mahalanobis' else None)
+
+        scores = [1 / (distances(metric) / len(self.input_skills) + 1) for metric in ('euclidean', 'cityblock')]
+
+        try:
+            scores.append(1 / (distances('mahalanobis') / len(self.input_skills) + 1))
+        except:
+            # Average of all inverses' average Euclidean and Manhattan distances only, without Mahalanobis distance
+                # Due to the singularity matrix for inverse - this happens when the baseline has only one skill without required level.
+                    # Hence after cosine scoring, it will keep all the users having given skill.
+                    # Since there are not users without given skill, all users will have zero numeric value
+                    # Hence, the variance will be zero which is reflected in covariance matrix
+                    # Hence it does not have inverse since is has zero determinant.
+            pass
+
+        return scores
+
+
+    # Matrix of baseline (1st row) and the volunteers/mentors (given rows of the skills index) w.r.t. skills' levels and weights
+    def level_matrix(self, skill_index, rows):
+
+        # Encoding the skills' levels into numeric levels by the lookup table of the level distances:
+        ## The volunteers/mentors who have the same skill level for given skill as the baseline has numeric value:
+            # These volunteers/mentors will then have 0 distance -> perfect similarity score for given skill
+        ## The volunteers/mentors with the nearest higher level will have lower non-value than the volunteers/mentors with the nearest lower level, w.r.t. baseline:
+            # e.g., if we look for Python mediors, hence Python seniors will have higher scores than Python juniors (we prefer higher level over lower level)
+        ## If the skill level is missing, but the volunteer/mentor has given skill, then it will have the the highest value (higher distance) than the other skill values (junior, medior, senior, mentor)
+        ## If the skill level missing and the volunteer/mentor does not have given skill, then it will have the highest possible value given by the X_const (i.e., the highest distance) (the least preferred option)
+            # This is applicable when we required more than one skill, hence through the cosine filtering will pass any volunteers/mentors having at least one skill in common w.r.t. baseline.
+        ## Special case is if the baseline's skill level is empty, i.e., we do not prefer any skill level, just the skill itself.
+            # Hence all the volunteers/mmentors who have non-empty skill level for given skill (junior/medior/senior/mentor) or have given skill but missing skill level, will have value 0 -> zero distance -> higher score
+            # All the others will have non-zero value given by X_const.
+
+        baseline, encoding = self.level_encoding(skill_index)
+        # Volunteers'/Mentors' level codes of the input skills
+        codes = skill_index.levels[np.ix_(rows, skill_index.columns_of(self.input_skills))]
+        levels = encoding[np.arange(len(self.input_skills)), codes]
+
+        ## If the partial credit of the related skills is requested, the missing skill's value is moved from X_const
+            # towards the value of the non-missing skill with missing level by the credit of the volunteer's/mentor's related skills
+        if self.related_skills is not None:
+            credit = self.related_credit(skill_index, rows)
+            levels = np.where(codes == skill_index.x_code,
+                              encoding[:, skill_index.x_code] + credit * (encoding[:, skill_index.na_code] - encoding[:, skill_index.x_code]),
+                              levels)
+
+        return np.vstack((baseline, levels))
+
+
+    # Related skills of the input skills (their columns in the skills index) and their similarities (related skills x input skills)
+        # Only the similarities of at least the minimal similarity are kept
+    def related(self, skill_index):
+
+        similarity = np.asarray(skill_index.similarity)[:, skill_index.columns_of(self.input_skills)]
+        similarity = np.where(similarity >= self.related_skills, similarity, 0)
+        columns = np.flatnonzero(similarity.any(axis = 1))
+
+        return columns, similarity[columns]
+
+
+    # Partial credit of the input skills given by the volunteers'/mentors' related skills (given rows x input skills)
+        # Sum of the similarities of the related skills which they have (at most 1), i.e., one matrix multiply of the related skills' columns only
+    def related_credit(self, skill_index, rows):
+
+        columns, similarity = self.related(skill_index)
+        occurrences = skill_index.indicator_of([skill_index.skills[col] for col in columns], rows)
+
+        return np.minimum(occurrences @ similarity, 1)
+
+
+    # Candidates of the matching (rows of the skills index) - the volunteers/mentors having at least one of the input skills
+        # or, with the partial credit of the related skills, at least one of the input skills or their related skills
+    def candidates(self, skill_index):
+
+        if self.related_skills is None:
+            return skill_index.candidates(self.input_skills)
+
+        columns, _ = self.related(skill_index)
+
+        return skill_index.candidates(list(dict.fromkeys(self.input_skills + [skill_index.skills[col] for col in columns])))
+
+
+    # Encoding of the input skills' levels: the baseline's values and the weighted distances of each level code (input skills x level codes)
+    def level_encoding(self, skill_index):
+
+        # Required levels' rows in the lookup table (junior / medior / senior / mentor, or 'any' level)
+        required = np.array([LEVELS.index(v['level']) if v['level'] in LEVELS else len(LEVELS)
+                             for v in self.input_skills_levels.values()])
+        # Optional weigthing for penalizing the dissimilarity of the skills' levels w.r.t. baseline
+        weights = np.array([v.get('weight', 1) for v in self.input_skills_levels.values()], dtype = np.double)
+
+        # Baseline has the required level, or the missing level if any level is required
+        baseline = self.distance_table[required, np.where(required < len(LEVELS), required, skill_index.na_code)] * weights
+
+        return baseline, self.distance_table[required] * weights[:, None]
+
+
+    # Inverses of the average distances of the volunteers/mentors (given rows of the skills index) w.r.t. skills' levels and weights
+    def level_scores(self, skill_index, rows):
+
+        # Matrix of baseline and the volunteers/mentors (w.r.t. skills' levels and weights)
+        self.lvl_skills_matrix = self.level_matrix(skill_index, rows)
+
+        # Inverses of the average distances
+        scores = self.distance_scores(self.lvl_skills_matrix)
+
+        # Average of all the inverses' average distances
+        self.inv_dist_scores = np.mean(scores, axis = 0)
+
+        return scores
+
+
+    # Final scores of a chunk of the matched rows (vectorized backend)
+        # given the inverse of the Mahalanobis covariance matrix of all the matched rows (None if it is singular)
+        # The scores are identical to the scores of the chunk's rows scored with all the matched rows
+    def chunk_scores(self, skill_index, rows, VI):
+
+        lvl_skills_matrix = self.level_matrix(skill_index, rows)
+        metrics = ['euclidean', 'cityblock'] + (['mahalanobis'] if VI is not None else [])
+
+        scores = [1 / (distances_one_to_many(lvl_skills_matrix[0], lvl_skills_matrix[1:], metric, VI) / len(self.input_skills) + 1)
+                  for metric in metrics]
+
+        return np.round(np.mean(scores, axis = 0), 2)
+
+
+    # Matched volunteers/mentors (rows of the skills index) and their final scores
+        # The skills index (built once per snapshot) replaces the per-request work with the whole table's columns
+    def match(self, skill_index):
+
+        if self.backend == 'pairwise' and self.related_skills is None:
+            # Cosine scoring of all the volunteers/mentors and filtering non-zero cosine scores
+                # i.e., excluding the users with no matches
+            with stage('cosine'):
+                self.matched_rows = np.flatnonzero(self.cosine_scores(skill_index) > 0)
+        else:
+            # Candidates having at least one of the input skills (i.e., the users with non-zero cosine score)
+                # or their related skills are given by the inverted index of the skills, the other users are not scored at all
+            with stage('candidates'):
+                self.matched_rows = self.candidates(skill_index)
+
+        # Inverses of the average distances of the matched volunteers/mentors
+        with stage('distance'):
+            self.level_scores(skill_index, self.matched_rows)
+
+        return self.matched_rows, np.round(self.inv_dist_scores, 2)
+
+
+    # Scoring of the volunteers/mentors - result table with the output columns of the matched volunteers/mentors
+        # The data are the cleaned data frame or its display store (only the matched rows are taken from them)
+        # If the skills index is not given, it is built only for the input skills (from the cleaned data frame)
+        # The result table is sorted by score only if requested (see top_k for partial sorting)
+    def similarity_matching(self, preprocessed_df, skill_index = None, sort = True):
+
+        if skill_index is None:
+            skill_index = SkillIndex(preprocessed_df, {skill: skill for skill in self.input_skills},
+                                     self.skill_y_lvl_n_name, self.skill_n_lvl_n_name)
+
+        rows, scores = self.match(skill_index)
+
+        # Final result table, including the respective output columns of the matched volunteers/mentors
+            # The skills' levels missing in the data (e.g., in the display store) are taken from the skills index
+        with stage('result_table'):
+            level_cols = [f'{skill}_level' for skill in self.input_skills]
+            available = [col for col in self.display_columns if col != self.scoring_name and col in preprocessed_df.columns]
+
+            if isinstance(preprocessed_df, pd.DataFrame):
+                output_df = preprocessed_df.iloc[rows][available].reset_index(drop = True)
+            else:
+                output_df = preprocessed_df.take(rows, available)
+
+            missing_levels = [col for col in level_cols if col not in available]
+            if missing_levels:
+                output_df[missing_levels] = skill_index.levels_of([col[:-len('_level')] for col in missing_levels], rows)
+
+            # Assigning the final score to the result table
+            output_df[self.scoring_name] = scores
+            output_df = output_df[self.display_columns]
+
+        if sort:
+            output_df = output_df.sort_values(by = self.scoring_name, ascending = False)
+
+        return output_df
+
+
+
+## Function for the top k matched rows by score (ties in the order of the rows), all the matched rows if k is None
+def partial_top_k(rows, scores, k = None):
+
+    if k is None:
+        return rows, scores
+
+    order = np.lexsort((rows, -scores))[:k]
+
+    return rows[order], scores[order]
+
+
+
+# Skills index of the worker process of the parallel scoring (memory-mapped once per process, not pickled with the tasks)
+_worker_index = None
+
+
+def _init_worker(index_dir):
+
+    global _worker_index
+    _worker_index = SkillIndex.load(index_dir)
+
+
+## Function for scoring the whole position in the worker process (as in the single-process scoring)
+def _score_position(position, matcher, k):
+
+    rows, scores = matcher.match(_worker_index)
+
+    return (position, *partial_top_k(rows, scores, k))
+
+
+## Function for scoring a chunk of the position's matched rows in the worker process
+def _score_chunk(position, matcher, rows, VI, k):
+
+    return (position, *partial_top_k(rows, matcher.chunk_scores(_worker_index, rows, VI), k))
+
+
+## Function for scoring several positions on a process pool (for the offline batch runs and very large snapshots)
+ # The positions with more matched rows than chunk_rows are split into chunks of the rows scored by different processes,
+ # the inverse of the Mahalanobis covariance matrix is computed once from all the matched rows, so the scores are identical
+ # to the single-process scoring (SkillsMatcher.match of each position, see score_positions in cli.py)
+ # The workers memory-map the skills index saved in index_dir (e.g., the on-disk snapshot), it is saved into a temporary directory if not given
+ # Returns the matched rows and their scores for each position (only the top k by score, ties in the order of the rows, if k is given)
+def parallel_matching(matchers, skill_index, workers = None, chunk_rows = 100000, k = None, index_dir = None):
+
+    if any(matcher.backend != 'vectorized' for matcher in matchers):
+        raise ValueError('The parallel scoring requires the vectorized scoring backend')
+
+    tmp_dir = None
+
+    if index_dir is None:
+        tmp_dir = index_dir = tempfile.mkdtemp(prefix = 'skill-index-')
+        skill_index.save(index_dir)
+
+    parts = [[] for _ in matchers]
+
+    try:
+        with ProcessPoolExecutor(max_workers = workers or os.cpu_count(), initializer = _init_worker,
+                                 initargs = (index_dir,)) as pool:
+            futures = []
+
+            for position, matcher in enumerate(matchers):
+                rows = matcher.candidates(skill_index)
+
+                if len(rows) <= chunk_rows:
+                    futures.append(pool.submit(_score_position, position, matcher, k))
+                    continue
+
+                # Inverse of the Mahalanobis covariance matrix of all the matched rows (omitted if it is singular)
+                try:
+                    VI = mahalanobis_inverse(matcher.level_matrix(skill_index, rows))
+                except Exception:
+                    VI = None
+
+                futures += [pool.submit(_score_chunk, position, matcher, rows[start:start + chunk_rows], VI, k)
+                            for start in range(0, len(rows), chunk_rows)]
+
+            # Chunks are collected in the order of their rows
+            for future in futures:
+                position, rows, scores = future.result()
+                parts[position].append((rows, scores))
+
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors = True)
+
+    # Merging the chunks (and their partial top k)
+    return [partial_top_k(np.concatenate([rows for rows, _ in chunks]), np.concatenate([scores for _, scores in chunks]), k)
+            for chunks in parts]
+
+
+
+## Function for the sorting key of the result table's column
+ # Numbers stored as strings (with empty strings instead of N/A) are sorted as numbers
+def sort_key(column):
+
+    try:
+        return column.replace({'': np.nan}).astype('float')
+    except (ValueError, TypeError):
+        return column
+
+
+
+## Function for the top k rows of the result table sorted by the sorting columns (all rows if k is None)
+ # The rows keep their index (i.e., their positions in the unsorted result table)
+ # Only the rows which can get into the top k by the 1st sorting column (including its ties) are sorted,
+ # the rest is discarded by the partial sorting (argpartition) in linear time
+def top_k(output_df, sort_cols, ascending, k = None):
+
+    if k is not None and k < len(output_df):
+        # Partial sorting of the 1st sorting column (missing values last)
+        primary = sort_key(output_df[sort_cols[0]]).to_numpy(dtype = np.double)
+        primary = np.where(np.isnan(primary), np.inf, primary if ascending[0] else -primary)
+
+        kth = primary[np.argpartition(primary, k - 1)[k - 1]]
+        output_df = output_df[primary <= kth]
+
+    # Sorting the remaining rows by all the sorting columns (ties are kept in the original order)
+    keys = pd.DataFrame({i: sort_key(output_df[col]).values for i, col in enumerate(sort_cols)})
+    order = keys.sort_values(by = list(keys.columns), ascending = ascending, kind = 'mergesort').index
+
+    return output_df.iloc[order[:k]]
+
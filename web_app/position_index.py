@@ -0,0 +1,169 @@
+import json
+
+import numpy as np
+import yaml
+
+from skill_index import LEVELS
+from matcher import mahalanobis_inverse
+
+
+## Function for the skills given as a list of {skill, level, weight} (or the skills' names only) -> skills' input
+ # The skills are given by their columns' names (slugs) or by their names with diacritics from skills_map.json
+def parse_skills(skills, skills_map):
+
+    slugs = set(skills_map.values())
+    skills_input = {}
+
+    for skill in skills or []:
+        skill = skill if isinstance(skill, dict) else {'skill': skill}
+        slug = skill.get('skill') if skill.get('skill') in slugs else skills_map.get(skill.get('skill'))
+
+        if slug is None:
+            raise ValueError(f'unknown skill "{skill.get("skill")}"')
+
+        skills_input[slug] = {'level': (skill.get('level') or '').lower(), 'weight': float(skill.get('weight') or 1.0)}
+
+    return skills_input
+
+
+## Function for parsing the positions (list of positions with their names and required skills)
+ # Returns the positions' names and skills' inputs
+def parse_positions(positions, skills_map):
+
+    if isinstance(positions, dict):
+        positions = positions.get('positions')
+
+    if not isinstance(positions, list) or not positions:
+        raise ValueError('expected a non-empty list of positions')
+
+    parsed = []
+
+    for i, position in enumerate(positions):
+        name = str(position.get('name') or f'position_{i}')
+
+        try:
+            skills_input = parse_skills(position.get('skills'), skills_map)
+        except ValueError as e:
+            raise ValueError(f'{e} of the position "{name}"')
+
+        if not skills_input:
+            raise ValueError(f'the position "{name}" requires at least one skill')
+
+        parsed.append((name, skills_input))
+
+    return parsed
+
+
+## Function for reading the positions from the YAML / JSON file
+ # The file contains a list of positions (or {'positions': [...]}), each with its name and required skills:
+ #   - name: Backend developer
+ #     skills:
+ #       - {skill: backend, level: medior, weight: 2}
+ #       - {skill: Python}
+def read_positions(path, skills_map):
+
+    with open(path, 'r', encoding = 'utf-8') as f:
+        positions = json.load(f) if path.endswith('.json') else yaml.safe_load(f)
+
+    try:
+        return parse_positions(positions, skills_map)
+    except (ValueError, AttributeError) as e:
+        raise ValueError(f'{path}: {e}')
+
+
+
+# Index of the open positions for the reverse matching (positions ranked for a volunteer / mentor)
+    # The positions' required skills are encoded as in the matching of the volunteers / mentors (SkillsMatcher's level encoding),
+    # stacked into matrices (positions x required skills, padded to the largest position), so one volunteer / mentor
+    # is scored against all the positions at once
+    # The inverse of the Mahalanobis covariance matrix of each position is computed once from its matched volunteers / mentors,
+    # hence the volunteer's / mentor's score of the position is the same as in the position's result table
+class PositionIndex:
+    def __init__(self,
+                 names, # Positions' names
+                 matchers, # SkillsMatchers of the positions' required skills
+                 skill_index # Skills index of the snapshot
+                 ):
+
+        self.names = list(names)
+        self.skills_inputs = [matcher.input_skills_levels for matcher in matchers]
+
+        n_positions, n_skills = len(matchers), max(len(matcher.input_skills) for matcher in matchers)
+        n_codes = len(skill_index.level_names)
+
+        # Number of the required skills of each position
+        self.n_skills = np.array([len(matcher.input_skills) for matcher in matchers], dtype = np.double)
+        # Columns of the required skills in the skills index and the mask of the required skills (the padding is not required)
+        self.columns = np.zeros((n_positions, n_skills), dtype = np.intp)
+        self.required = np.zeros((n_positions, n_skills), dtype = bool)
+        # Baseline's values and the weighted distances of the level codes (positions x required skills (x level codes))
+        self.baseline = np.zeros((n_positions, n_skills))
+        self.encoding = np.zeros((n_positions, n_skills, n_codes))
+        # Inverses of the Mahalanobis covariance matrices (zeros if the covariance matrix of the position is singular)
+        self.VI = np.zeros((n_positions, n_skills, n_skills))
+        self.mahalanobis = np.zeros(n_positions, dtype = bool)
+
+        for i, matcher in enumerate(matchers):
+            k = len(matcher.input_skills)
+
+            self.columns[i, :k] = skill_index.columns_of(matcher.input_skills)
+            self.required[i, :k] = True
+            self.baseline[i, :k], self.encoding[i, :k] = matcher.level_encoding(skill_index)
+
+            # The same covariance matrix as in the position's matching (baseline and all its matched volunteers / mentors)
+            try:
+                self.VI[i, :k, :k] = mahalanobis_inverse(matcher.level_matrix(skill_index, skill_index.candidates(matcher.input_skills)))
+                self.mahalanobis[i] = True
+            except Exception:
+                pass
+
+
+    # Number of the positions
+    def __len__(self):
+
+        return len(self.names)
+
+
+    # Level codes and skills' occurrences of the volunteer / mentor in given row of the skills index
+    @staticmethod
+    def profile_of(skill_index, row):
+
+        codes = np.asarray(skill_index.levels[row])
+
+        return codes, np.unpackbits(skill_index.bits[row], count = len(codes)).astype(bool)
+
+
+    # Level codes and skills' occurrences of the volunteer / mentor given by their skills' input (e.g., not in the snapshot yet)
+        # The skills without level have the missing level, the other skills are missing
+    @staticmethod
+    def profile_from_skills(skill_index, skills_input):
+
+        codes = np.full(len(skill_index.skills), skill_index.x_code, dtype = np.int8)
+
+        for skill, props in skills_input.items():
+            codes[skill_index.columns[skill]] = LEVELS.index(props['level']) if props.get('level') in LEVELS else skill_index.na_code
+
+        return codes, codes != skill_index.x_code
+
+
+    # Positions matched by the volunteer / mentor (at least one required skill in common) and their final scores
+        # sorted by score (ties in the order of the positions), only the top k positions if k is given
+    def rank(self, codes, occurrences, k = None):
+
+        # Weighted distances of the volunteer's / mentor's levels vs. the baseline of each position (zero for the padding)
+        levels = np.take_along_axis(self.encoding, codes[self.columns][:, :, None], axis = 2)[:, :, 0]
+        diff = np.where(self.required, levels - self.baseline, 0)
+
+        euclidean = np.sqrt(np.einsum('ij,ij->i', diff, diff))
+        cityblock = np.abs(diff).sum(axis = 1)
+        mahalanobis = np.sqrt(np.einsum('ij,ijk,ik->i', diff, self.VI, diff))
+
+        # Average of the inverses' average distances (without Mahalanobis distance if the position's covariance matrix is singular)
+        scores = (1 / (euclidean / self.n_skills + 1) + 1 / (cityblock / self.n_skills + 1)
+                  + np.where(self.mahalanobis, 1 / (mahalanobis / self.n_skills + 1), 0)) / np.where(self.mahalanobis, 3, 2)
+        scores = np.round(scores, 2)
+
+        matched = np.flatnonzero((occurrences[self.columns] & self.required).any(axis = 1))
+        order = np.lexsort((matched, -scores[matched]))[:k]
+
+        return matched[order], scores[matched[order]]
@@ -0,0 +1,188 @@
+import os
+import sys
+import time
+import uuid
+import pickle
+import threading
+from collections import OrderedDict
+
+
+## Function for the approximate size of the stored search result in bytes
+def size_of(value):
+
+    # Pandas is imported only with the first stored result (not at the app's start)
+    import pandas as pd
+
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index = True, deep = True).sum())
+
+    elif isinstance(value, dict):
+        return sys.getsizeof(value) + sum(size_of(v) for v in value.values())
+
+    else:
+        return sys.getsizeof(value)
+
+
+
+# In-memory store of the search results keyed by the search ID
+    # The least recently used results are evicted when the byte budget is exceeded, the expired results are never returned
+class MemoryResultStore:
+    def __init__(self,
+                 ttl, # Number of seconds for which the search result is kept
+                 max_bytes # Byte budget of all the stored search results
+                 ):
+
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+        # Search ID -> (expiration time, size, search result) in the order of the last usage
+        self._results = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+
+    def _evict(self, search_id):
+
+        _, size, _ = self._results.pop(search_id)
+        self._bytes -= size
+
+
+    # Storing the search result and returning its new search ID
+    def put(self, result):
+
+        search_id = uuid.uuid4().hex
+        size = size_of(result)
+
+        with self._lock:
+            self._results[search_id] = (time.monotonic() + self.ttl, size, result)
+            self._bytes += size
+
+            # Evicting the least recently used results over the byte budget (the new result is always kept)
+            while self._bytes > self.max_bytes and len(self._results) > 1:
+                self._evict(next(iter(self._results)))
+
+        return search_id
+
+
+    # Search result of given search ID (None if unknown or expired)
+    def get(self, search_id):
+
+        with self._lock:
+            if search_id not in self._results:
+                return None
+
+            expires_at, _, result = self._results[search_id]
+
+            if expires_at < time.monotonic():
+                self._evict(search_id)
+                return None
+
+            self._results.move_to_end(search_id)
+
+            return result
+
+
+
+# Local-disk store of the search results keyed by the search ID (shared by all the workers on one host)
+    # The oldest results are deleted when the byte budget is exceeded, the expired results are never returned
+class DiskResultStore:
+    def __init__(self,
+                 directory, # Directory of the stored search results
+                 ttl, # Number of seconds for which the search result is kept
+                 max_bytes # Byte budget of all the stored search results
+                 ):
+
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+        os.makedirs(self.directory, exist_ok = True)
+
+
+    def _path(self, search_id):
+
+        return os.path.join(self.directory, f'{search_id}.pkl')
+
+
+    # Deleting the expired results and the oldest results over the byte budget
+    def _cleanup(self):
+
+        files = []
+
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.pkl'):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+
+            if stat.st_mtime + self.ttl < time.time():
+                self._remove(entry.path)
+            else:
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in files)
+
+        for _, size, path in sorted(files)[:-1]:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+
+    def _remove(self, path):
+
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+    def put(self, result):
+
+        search_id = uuid.uuid4().hex
+        path = self._path(search_id)
+
+        # Writing into a temporary file first, so the other workers never read a half-written result
+        with open(f'{path}.tmp', 'wb') as f:
+            pickle.dump(result, f, protocol = pickle.HIGHEST_PROTOCOL)
+        os.replace(f'{path}.tmp', path)
+
+        self._cleanup()
+
+        return search_id
+
+
+    def get(self, search_id):
+
+        # Only hexadecimal search IDs are accepted (no paths from the request)
+        if not search_id or not all(c in '0123456789abcdef' for c in search_id):
+            return None
+
+        path = self._path(search_id)
+
+        try:
+            if os.path.getmtime(path) + self.ttl < time.time():
+                self._remove(path)
+                return None
+
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+
+        except Exception:
+            return None
+
+
+
+## Function for the result store given by the configuration ('memory' or 'disk' backend)
+def result_store_from_config(store_config):
+
+    if store_config['backend'] == 'memory':
+        return MemoryResultStore(store_config['ttl'], store_config['max_bytes'])
+
+    elif store_config['backend'] == 'disk':
+        return DiskResultStore(store_config['dir'], store_config['ttl'], store_config['max_bytes'])
+
+    else:
+        raise ValueError(f"Unknown result store backend: {store_config['backend']}")
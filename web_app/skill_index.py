@@ -0,0 +1,219 @@
+import os
+import json
+
+import numpy as np
+
+
+# Skills' levels in the order of their codes in the level-code matrix
+    # followed by the indicators for missing level (code 4) and for missing skill and level (code 5)
+LEVELS = ['junior', 'medior', 'senior', 'mentor']
+
+
+## Function for the labels of the skills with their levels for listing the other skills (skills x level codes)
+ # If skill level is missing, the label is only the skill name w/o skill level
+def skill_labels(names):
+
+    return np.array([[f'{name} ({lvl.capitalize()})' for lvl in LEVELS] + [name, name] for name in names],
+                    dtype = object).reshape(len(names), len(LEVELS) + 2)
+
+
+
+## Function for the similarities of the skills by their co-occurrence (cosine similarity of the skills' occurrences' columns)
+ # The skill's similarity with itself is zero (only the other skills are related to it)
+def skill_similarity(occurrences):
+
+    counts = occurrences.T @ occurrences
+    norms = np.sqrt(np.diag(counts))
+    norms[norms == 0] = 1
+
+    similarity = (counts / np.outer(norms, norms)).astype(np.float32)
+    np.fill_diagonal(similarity, 0)
+
+    return similarity
+
+
+
+# Index of the skills' occurrences and levels of the volunteers / mentors
+    # It is built once per snapshot and reused by all the searches
+    # It can be saved as NumPy files and loaded memory-mapped (the processes on one host share the same pages)
+class SkillIndex:
+    def __init__(self,
+                 processed_df, # Cleaned volunteers' / mentors' table
+                 skills_map, # Mapping of the skills' names with diacritics -> columns' names
+                 skill_y_lvl_n_name, # Indicator for non-missing skill with missing level
+                 skill_n_lvl_n_name # Indicator for missing skill and missing level
+                 ):
+
+        # Skills' columns and names (with diacritics) in the order of the skills map
+        self.skills = list(skills_map.values())
+        self.names = list(skills_map.keys())
+        # Lookup of the column position in the matrices by the skill's column name
+        self.columns = {skill: i for i, skill in enumerate(self.skills)}
+        # Names of the level codes
+        self.level_names = np.array(LEVELS + [skill_y_lvl_n_name, skill_n_lvl_n_name], dtype = object)
+
+        self.na_code = len(LEVELS)
+        self.x_code = len(LEVELS) + 1
+
+        # 0-1 matrix of the skills' occurrences (volunteers / mentors x skills), only needed while building the index
+        indicator = np.nan_to_num(processed_df[self.skills].to_numpy(dtype = np.float32))
+
+        # Packed bit matrix of the skills' occurrences (8 skills per byte in each row)
+        self.bits = np.packbits(indicator > 0, axis = 1)
+
+        # Similarities of the skills by their co-occurrence (skills x skills), e.g., for the partial credit of the related skills
+        self.similarity = skill_similarity((indicator > 0).astype(np.float32))
+
+        # Matrix of the skills' level codes (volunteers / mentors x skills)
+            # Unknown level of a non-missing skill is treated as a missing level
+        codes = {name: code for code, name in enumerate(self.level_names)}
+        self.levels = np.empty(indicator.shape, dtype = np.int8)
+
+        for i, skill in enumerate(self.skills):
+            self.levels[:, i] = [codes.get(lvl, self.na_code if ind == 1 else self.x_code)
+                                 for ind, lvl in zip(indicator[:, i], processed_df[f'{skill}_level'])]
+
+        # Inverted index of the skills - sorted rows of the volunteers / mentors having given skill (for each skill)
+        self.postings = [np.flatnonzero(indicator[:, i] > 0).astype(np.int32) for i in range(len(self.skills))]
+
+        # Labels of the skills with their levels for listing the other skills (skills x level codes)
+        self.labels = skill_labels(self.names)
+
+
+    # Saving the index into the directory (matrices as .npy files, the skills' order and level names as JSON)
+    def save(self, directory):
+
+        os.makedirs(directory, exist_ok = True)
+
+        np.save(os.path.join(directory, 'bits.npy'), self.bits)
+        np.save(os.path.join(directory, 'levels.npy'), self.levels)
+        np.save(os.path.join(directory, 'similarity.npy'), self.similarity)
+        # Postings of all the skills concatenated, split by their offsets
+        np.save(os.path.join(directory, 'postings.npy'), np.concatenate(self.postings + [np.empty(0, dtype = np.int32)]))
+        np.save(os.path.join(directory, 'postings_offsets.npy'), np.cumsum([0] + [len(p) for p in self.postings]))
+
+        with open(os.path.join(directory, 'skills.json'), 'w', encoding = 'utf-8') as f:
+            json.dump({'skills': self.skills, 'names': self.names, 'level_names': list(self.level_names)}, f, ensure_ascii = False)
+
+
+    # Index saved in the directory, its matrices are memory-mapped (read-only)
+        # Raises an error if the expected skills (columns' names) are given and the index was built with other skills
+    @classmethod
+    def load(cls, directory, skills = None):
+
+        with open(os.path.join(directory, 'skills.json'), 'r', encoding = 'utf-8') as f:
+            meta = json.load(f)
+
+        if skills is not None and meta['skills'] != list(skills):
+            raise ValueError(f'{directory}: the skills index was built with another skills map')
+
+        index = cls.__new__(cls)
+
+        index.skills = meta['skills']
+        index.names = meta['names']
+        index.columns = {skill: i for i, skill in enumerate(index.skills)}
+        index.level_names = np.array(meta['level_names'], dtype = object)
+        index.na_code = len(LEVELS)
+        index.x_code = len(LEVELS) + 1
+
+        index.bits = np.load(os.path.join(directory, 'bits.npy'), mmap_mode = 'r')
+        index.levels = np.load(os.path.join(directory, 'levels.npy'), mmap_mode = 'r')
+        index.similarity = np.load(os.path.join(directory, 'similarity.npy'))
+
+        postings = np.load(os.path.join(directory, 'postings.npy'), mmap_mode = 'r')
+        offsets = np.load(os.path.join(directory, 'postings_offsets.npy'))
+        index.postings = [postings[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+
+        index.labels = skill_labels(index.names)
+
+        return index
+
+
+    # Number of the volunteers / mentors
+    def __len__(self):
+
+        return self.levels.shape[0]
+
+
+    # Column positions of given skills in the matrices
+    def columns_of(self, skills):
+
+        return np.array([self.columns[skill] for skill in skills], dtype = np.intp)
+
+
+    # Sorted rows of the volunteers / mentors having at least one of given skills (union of the skills' postings)
+        # i.e., the rows with non-zero cosine similarity to the baseline of given skills
+    def candidates(self, skills):
+
+        postings = [self.postings[self.columns[skill]] for skill in skills]
+
+        if len(postings) == 1:
+            return postings[0].astype(np.intp)
+
+        return np.unique(np.concatenate(postings)).astype(np.intp)
+
+
+    # 0-1 matrix of the skills' occurrences for given skills only (unpacked from the bit matrix)
+    def indicator_of(self, skills, rows = None):
+
+        cols = self.columns_of(skills)
+        packed = self.bits[:, cols >> 3] if rows is None else self.bits[np.ix_(rows, cols >> 3)]
+
+        return ((packed >> (7 - (cols & 7)).astype(np.uint8)) & 1).astype(np.float32)
+
+
+    # Skills' levels (as strings) for given skills only
+    def levels_of(self, skills, rows = None):
+
+        cols = self.columns_of(skills)
+        codes = self.levels[:, cols] if rows is None else self.levels[np.ix_(rows, cols)]
+
+        return self.level_names[codes]
+
+
+
+# Skills of the matched volunteers / mentors kept with the search (level codes and packed occurrences of the matched rows only)
+    # The level strings of the required skills and the other skills' labels are materialized only for the displayed rows
+class MatchedSkills:
+    def __init__(self,
+                 skill_index, # Skills index of the snapshot
+                 rows, # Matched rows of the skills index
+                 required # Required skills' columns, which are not listed among the other skills
+                 ):
+
+        self.labels = skill_index.labels
+        self.level_names = skill_index.level_names
+        self.columns = skill_index.columns
+
+        # Level codes and packed occurrences of the matched rows
+        self.codes = skill_index.levels[rows]
+        self.bits = skill_index.bits[rows]
+
+        # Columns of the other skills (all the skills but the required ones)
+        self.other = np.ones(self.codes.shape[1], dtype = bool)
+        self.other[skill_index.columns_of(required)] = False
+
+
+    # Levels (as strings) of given skills for given matched rows (positions in the matched rows)
+    def levels(self, positions, skills):
+
+        cols = np.array([self.columns[skill] for skill in skills], dtype = np.intp)
+
+        return self.level_names[self.codes[np.ix_(np.asarray(positions, dtype = np.intp), cols)]]
+
+
+    # Other skills of given matched rows (positions in the matched rows) joined into one string per row
+    def other_skills(self, positions):
+
+        positions = np.asarray(positions, dtype = np.intp)
+        codes = self.codes[positions]
+        listed = np.unpackbits(self.bits[positions], axis = 1, count = codes.shape[1]).astype(bool) & self.other
+        labels = self.labels[np.arange(codes.shape[1]), codes]
+
+        return [' / '.join(row_labels[row_listed]) for row_labels, row_listed in zip(labels, listed)]
+
+
+    # Size in bytes (for the byte budget of the result store)
+    def __sizeof__(self):
+
+        return self.codes.nbytes + self.bits.nbytes + self.other.nbytes + self.labels.nbytes
@@ -0,0 +1,704 @@
+import os
+import re
+import json
+import time
+import shutil
+import pickle
+import hashlib
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from instrumentation import stage, log_event
+
+
+# Pandas and the database drivers are imported only when a table is queried (not at the app's start)
+
+# Version of the on-disk snapshots, increased whenever their format, the cleaned table or the skills index change
+    # (the snapshots of the previous versions are not read)
+SNAPSHOT_VERSION = 5
+
+
+## Function for the column's name without Keboola's extra underscores in the skill level columns
+ # Keboola bug - it somehow adds an extra underscore to several columns names and remove diacritics
+def normalized_column(col):
+
+    if '____level' in col:
+        return col.replace('____level', '_level')
+    elif '__level' in col:
+        return col.replace('__level', '_level')
+    else:
+        return col
+
+
+## Function for the table's columns which are required (matched by their normalized names), all columns if not given
+def projected_columns(table_columns, required = None):
+
+    if required is None:
+        return list(table_columns)
+
+    required = set(required)
+
+    return [col for col in table_columns if normalized_column(col) in required]
+
+
+## Function for the quoted column / table name in the SQL query
+def quoted(name):
+
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+## Function for the query's result as a data frame
+ # Snowflake's Arrow result batches are concatenated column-wise (no Python objects row by row), other cursors are fetched at once
+def fetch_frame(cursor):
+
+    import pandas as pd
+
+    columns = [col[0] for col in cursor.description]
+
+    try:
+        batches = cursor.fetch_pandas_batches()
+    except Exception:
+        # Not a Snowflake cursor, the result is not in the Arrow format or pyarrow is not installed
+        batches = None
+
+    if batches is not None:
+        frames = list(batches)
+        return pd.concat(frames, ignore_index = True) if frames else pd.DataFrame(columns = columns)
+
+    return pd.DataFrame.from_records(cursor.fetchall(), columns = columns)
+
+
+
+# SQL source of the volunteers' / mentors' tables (the connection is given by the subclass's cursor)
+class SQLSource:
+
+    # Running the SQL query and returning the result as a data frame
+    def query(self, sql_query):
+
+        with self.cursor() as cursor:
+            cursor.execute(sql_query)
+            return fetch_frame(cursor)
+
+
+    # Columns of the table (without fetching any rows)
+    def table_columns(self, table_name):
+
+        with self.cursor() as cursor:
+            cursor.execute(f'select * from {quoted(table_name)} limit 0')
+            return [col[0] for col in cursor.description]
+
+
+    # Last update of the table (the latest value of the timestamp column)
+    def read_timestamp(self, table_name, timestamp_col):
+
+        return self.query(f'select max({quoted(timestamp_col)}) as "ts" from {quoted(table_name)}').iloc[0, 0]
+
+
+    # Table as a data frame, only with the required columns (if given)
+    def read_table(self, table_name, columns = None):
+
+        if columns is None:
+            return self.query(f'select * from {quoted(table_name)}')
+
+        projection = projected_columns(self.table_columns(table_name), columns)
+
+        return self.query(f'select {", ".join(quoted(col) for col in projection) or "*"} from {quoted(table_name)}')
+
+
+
+# Snowflake source of the volunteers' / mentors' tables (integrated by Keboola)
+    # The connections are pooled and reused by all the requests (and by the warm Lambda invocations)
+class SnowflakeSource(SQLSource):
+    def __init__(self,
+                 account, # Snowflake account
+                 user, # Snowflake user
+                 password, # Snowflake password
+                 warehouse, # Snowflake warehouse
+                 database, # Snowflake database
+                 schema, # Snowflake schema (with the quotes)
+                 pool_size = 2 # Number of the pooled connections
+                 ):
+
+        self.account = account
+        self.user = user
+        self.password = password
+        self.warehouse = warehouse
+        self.database = database
+        self.schema = schema
+        self.pool_size = pool_size
+
+        # Pool of the connections (SQLAlchemy engine), or a single connection if the engine cannot be created
+        self._engine = None
+        self._connection = None
+        self._lock = threading.Lock()
+
+
+    # Pooled connection engine, created on the first query only
+    def engine(self):
+
+        with self._lock:
+            if self._engine is None:
+                import sqlalchemy
+
+                conn = (
+                        f"snowflake://{self.user}:{self.password}"
+                        f"@{self.account}/"
+                        f"?warehouse={self.warehouse}"
+                        f"&database={self.database}"
+                        f"&schema={self.schema}"
+                    )
+
+                # The stale connections (e.g., after a long idle time of the Lambda container) are replaced on checkout
+                self._engine = sqlalchemy.create_engine(conn, pool_size = self.pool_size, max_overflow = self.pool_size,
+                                                        pool_pre_ping = True, pool_recycle = 3600)
+
+            return self._engine
+
+
+    # Cursor of a pooled connection (the connection is returned into the pool afterwards)
+    @contextmanager
+    def cursor(self):
+
+        try:
+            conn = self.engine().raw_connection()
+        except Exception:
+            conn = None
+
+        if conn is None:
+            # Single reused connection of the Snowflake connector (if the engine cannot be used)
+            with self._lock:
+                cursor = self.connection().cursor()
+                try:
+                    yield cursor
+                finally:
+                    cursor.close()
+            return
+
+        cursor = conn.cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+            conn.close()
+
+
+    def connection(self):
+
+        if self._connection is None or self._connection.is_closed():
+            import snowflake.connector
+
+            self._connection = snowflake.connector.connect(
+                                                            account = self.account,
+                                                            user = self.user,
+                                                            password = self.password,
+                                                            warehouse = self.warehouse,
+                                                            database = self.database,
+                                                            schema = self.schema
+                                                        )
+
+        return self._connection
+
+
+
+# Local SQLite stand-in for the Snowflake source (e.g., for offline testing)
+class SQLiteSource(SQLSource):
+    def __init__(self, path):
+
+        self.path = path
+
+
+    @contextmanager
+    def cursor(self):
+
+        conn = sqlite3.connect(self.path)
+        cursor = conn.cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+            conn.close()
+
+
+
+# Local CSV stand-in for the Snowflake source - one '<table name>.csv' file per table in the given directory
+class CSVSource:
+    def __init__(self, directory):
+
+        self.directory = directory
+
+
+    def table_path(self, table_name):
+
+        return os.path.join(self.directory, f'{table_name}.csv')
+
+
+    def read_timestamp(self, table_name, timestamp_col):
+
+        import pandas as pd
+
+        return pd.read_csv(self.table_path(table_name), usecols = [timestamp_col], dtype = str)[timestamp_col].max()
+
+
+    def read_table(self, table_name, columns = None):
+
+        import pandas as pd
+
+        required = None if columns is None else set(columns)
+
+        # Snowflake returns the values as strings, empty values are kept as empty strings
+        return pd.read_csv(self.table_path(table_name), dtype = str, keep_default_na = False,
+                           usecols = None if required is None else lambda col: normalized_column(col) in required)
+
+
+
+## Function for selecting the data source based on the 'data_source' environment variable:
+ # 'snowflake' (default), 'sqlite:///<path to the database file>' or 'csv:///<path to the directory>'
+def source_from_env():
+
+    data_source = os.getenv('data_source', 'snowflake')
+
+    if data_source.startswith('sqlite:///'):
+        return SQLiteSource(data_source[len('sqlite:///'):])
+
+    elif data_source.startswith('csv:///'):
+        return CSVSource(data_source[len('csv:///'):])
+
+    elif data_source == 'snowflake':
+        return SnowflakeSource(os.getenv('snowflake_account'),
+                               os.getenv('snowflake_user'),
+                               os.getenv('snowflake_password'),
+                               os.getenv('snowflake_warehouse'),
+                               os.getenv('snowflake_database'),
+                               '"{}"'.format(os.getenv('snowflake_schema')))
+
+    else:
+        raise ValueError(f'Unknown data source: {data_source}')
+
+
+## Function for the URL of the data source selected by the 'data_source' environment variable (incl. Snowflake's database and schema)
+def source_url_from_env():
+
+    data_source = os.getenv('data_source', 'snowflake')
+
+    if data_source == 'snowflake':
+        return f'snowflake://{os.getenv("snowflake_account")}/{os.getenv("snowflake_database")}/{os.getenv("snowflake_schema")}'
+
+    return data_source
+
+
+## Function for the fingerprint of the snapshot's inputs other than the table itself
+ # (data source, skills map and the configuration which the snapshot is built with)
+    # The on-disk snapshots built from other inputs are not read, e.g., a table of another data source with the same timestamp
+def snapshot_fingerprint(source_url, skills_map, config):
+
+    inputs = json.dumps({'source': source_url, 'skills_map': list(skills_map.items()), 'config': config},
+                        sort_keys = True, ensure_ascii = False, default = str)
+
+    return hashlib.sha256(inputs.encode('utf-8')).hexdigest()[:16]
+
+
+
+## Function for cleaning the raw volunteers' / mentors' table
+ # The cleaning depends only on the table itself (not on the form's inputs), hence it is done once per snapshot
+def clean_snapshot(processed_df, skills_map, config):
+
+    # Keboola bug - it somehow adds an extra underscore to several columns names and remove diacritics
+    processed_df = processed_df.rename(columns = normalized_column)
+
+
+    # Excluding Internal Team users, i.e., the employees of Cesko.Digital
+    try:
+        processed_df = processed_df[processed_df[config['drop_rows']['col']] != config['drop_rows']['val']]
+    except:
+        pass
+
+    # Reset the row indices
+    processed_df = processed_df.reset_index(drop = True)
+
+
+    # If the skill is missing in given table, add the skill column with 0's (indicating non-occurrence of given skill)
+    # And/or if the skill level column is missing in given table,
+        # add the skill level column with empty strings (indicating missing level for given given skill)
+    # These steps are required for scoring/distance calculations
+    for skill in skills_map.values():
+        if skill not in processed_df.columns:
+            processed_df[skill] = 0
+        if f'{skill}_level' not in processed_df.columns:
+            processed_df[f'{skill}_level'] = ''
+
+    for col in skills_map.values():
+        # Keboola / Snowflake stores the skill indicators (0/1) as strings -> we conver them into numerics
+        processed_df[col] = processed_df[col].astype('float')
+
+        # Remapping None skill levels based on whether the skill is available
+            # If the skill is not missing, but the level is missing -> 'N/A level'
+            # If both the skill and level are missing -> 'X'
+
+        processed_df[f'{col}_level'] = [
+                                            config['mapping_lvl_nan']['skill_y_lvl_n']
+                                                if lvl == '' and ind == 1
+                                            else config['mapping_lvl_nan']['skill_n_lvl_n']
+                                                if lvl == '' and ind == 0
+                                            else lvl
+                                            for ind, lvl in zip(processed_df[col],
+                                                                processed_df[f'{col}_level'])
+                                            ]
+
+    return processed_df
+
+
+
+## Function for saving the part of the snapshot (skills index, display store or cleaned data frame) into the directory
+ # Returns the kind of the part for loading it back, the parts without their own format are pickled
+def save_part(part, directory):
+
+    if part is None:
+        return None
+
+    if hasattr(part, 'save'):
+        part.save(directory)
+        return type(part).__name__
+
+    os.makedirs(directory, exist_ok = True)
+    with open(os.path.join(directory, 'part.pkl'), 'wb') as f:
+        pickle.dump(part, f, protocol = pickle.HIGHEST_PROTOCOL)
+
+    return 'pickle'
+
+
+## Function for loading the part of the snapshot of given kind from the directory (the arrays are memory-mapped)
+ # The skills index is checked against the expected skills if they are given
+def load_part(kind, directory, skills = None):
+
+    if kind is None:
+        return None
+
+    elif kind == 'SkillIndex':
+        from skill_index import SkillIndex
+        return SkillIndex.load(directory, skills)
+
+    elif kind == 'DisplayStore':
+        from display_store import DisplayStore
+        return DisplayStore.load(directory)
+
+    with open(os.path.join(directory, 'part.pkl'), 'rb') as f:
+        return pickle.load(f)
+
+
+
+# Cleaned snapshot of the volunteers' / mentors' table
+class Snapshot:
+    def __init__(self, table_name, timestamp, data, index = None, path = None):
+
+        # Name of the source table
+        self.table_name = table_name
+        # Last update of the source table when the snapshot was loaded
+        self.timestamp = timestamp
+        # Cleaned data frame, or its display store if the snapshot keeps only the displayed columns
+        self.data = data
+        # Index of the skills' occurrences and levels (built once per snapshot)
+        self.index = index
+        # Directory of the on-disk snapshot (None if it is not stored), e.g., for memory-mapping its skills index by other processes
+        self.path = path
+
+
+
+## Function for loading the on-disk snapshot in the directory, its arrays are memory-mapped (shared by all the processes on one host)
+ # Returns None if the snapshot was stored by another version of the app, or built from other inputs if the fingerprint is given
+ # Raises an error if the expected skills are given and its skills index was built with other skills
+def load_snapshot(path, fingerprint = None, skills = None):
+
+    with open(os.path.join(path, 'meta.json'), 'r', encoding = 'utf-8') as f:
+        meta = json.load(f)
+
+    if meta['version'] != SNAPSHOT_VERSION:
+        return None
+
+    if fingerprint is not None and meta.get('fingerprint') != fingerprint:
+        return None
+
+    return Snapshot(meta['table_name'], meta['timestamp'],
+                    load_part(meta['data'], os.path.join(path, 'data')),
+                    load_part(meta['index'], os.path.join(path, 'index'), skills),
+                    path)
+
+
+
+# Cache of the cleaned snapshots keyed by the table name and refreshed only when the source timestamp advances
+    # With the background refresh (stale-while-revalidate), the searches are served from the previous snapshot
+    # while the new one is being built in a background thread, it is swapped in once it is complete
+class SnapshotCache:
+    def __init__(self,
+                 source, # Data source (Snowflake or its local stand-in)
+                 build, # Function building the cleaned data frame from the raw table
+                 timestamp_col, # Timestamp column (i.e., last update of the table)
+                 build_index = None, # Optional function building the skills index from the cleaned data frame
+                 build_display = None, # Optional function building the compact store of the displayed columns (replaces the cleaned data frame)
+                 check_interval = 0, # Minimal number of seconds between two checks of the source timestamp
+                 cache_dir = None, # Optional directory for storing the snapshots on disk (e.g., for Lambda cold starts)
+                 columns = None, # Optional required columns (normalized names), the other columns are not pulled from the source
+                 background_refresh = False, # Refreshing the outdated snapshots off the request path (the first load is always blocking)
+                 fingerprint = None, # Optional fingerprint of the snapshots' inputs (see snapshot_fingerprint), part of the on-disk snapshots' keys
+                 skills = None # Optional skills (columns' names) of the skills index, the on-disk snapshots with other skills are not used
+                 ):
+
+        self.source = source
+        self.columns = columns
+        self.build = build
+        self.build_index = build_index
+        self.build_display = build_display
+        self.timestamp_col = timestamp_col
+        self.check_interval = check_interval
+        self.cache_dir = cache_dir
+        self.background_refresh = background_refresh
+        self.fingerprint = fingerprint
+        self.skills = skills
+
+        # In-process snapshots and the times of their last timestamp check (keyed by the table name)
+        self._snapshots = {}
+        self._checked_at = {}
+        self._lock = threading.Lock()
+
+        # Locks of the tables' refreshes (one refresh of a table at a time) and the running background refreshes
+        self._refresh_locks = {}
+        self._refreshing = {}
+        # Background thread polling the source timestamps (if started)
+        self._poller = None
+
+
+    # Prefix of the on-disk snapshots of given table
+    def _disk_prefix(self, table_name):
+
+        return re.sub(r'[^0-9A-Za-z_.-]+', '_', f'{table_name}__')
+
+
+    # Suffix of the on-disk snapshots built from the cache's inputs by this version of the app
+    def _disk_suffix(self):
+
+        return (f'__{self.fingerprint}' if self.fingerprint else '') + f'__v{SNAPSHOT_VERSION}'
+
+
+    # Directory of the on-disk snapshot for given table and timestamp
+    def _disk_path(self, table_name, timestamp):
+
+        key = re.sub(r'[^0-9A-Za-z_.-]+', '_', str(timestamp)) + self._disk_suffix()
+
+        return os.path.join(self.cache_dir, self._disk_prefix(table_name) + key)
+
+
+    def _read_disk(self, table_name, timestamp):
+
+        if not self.cache_dir:
+            return None
+
+        # Missing, incompatible (e.g., pickled by another pandas version) or damaged snapshot is re-pulled from the source
+        try:
+            return load_snapshot(self._disk_path(table_name, timestamp), self.fingerprint, self.skills)
+        except Exception:
+            return None
+
+
+    # Latest on-disk snapshot of given table regardless of its timestamp (None if there is not any)
+        # e.g., for serving the searches of a new process right away while the source timestamp is being checked
+    def _read_latest_disk(self, table_name):
+
+        if not self.cache_dir:
+            return None
+
+        prefix, suffix = self._disk_prefix(table_name), self._disk_suffix()
+
+        try:
+            paths = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir)
+                     if name.startswith(prefix) and name.endswith(suffix)]
+            paths = [path for path in paths if os.path.exists(os.path.join(path, 'meta.json'))]
+
+            if not paths:
+                return None
+
+            return load_snapshot(max(paths, key = lambda path: os.path.getmtime(os.path.join(path, 'meta.json'))),
+                                 self.fingerprint, self.skills)
+        except Exception:
+            return None
+
+
+    # Writing the snapshot into its directory and removing the previous snapshots of its table
+        # Returns the snapshot loaded back from the disk (memory-mapped) or the given one if it cannot be written
+    def _write_disk(self, snapshot):
+
+        if not self.cache_dir:
+            return snapshot
+
+        path = self._disk_path(snapshot.table_name, snapshot.timestamp)
+        tmp_path = f'{path}.tmp{os.getpid()}_{threading.get_ident()}'
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok = True)
+
+            # Writing into a temporary directory first, so the other processes never read a half-written snapshot
+            meta = {'version': SNAPSHOT_VERSION, 'fingerprint': self.fingerprint,
+                    'table_name': snapshot.table_name, 'timestamp': str(snapshot.timestamp),
+                    'data': save_part(snapshot.data, os.path.join(tmp_path, 'data')),
+                    'index': save_part(snapshot.index, os.path.join(tmp_path, 'index'))}
+
+            with open(os.path.join(tmp_path, 'meta.json'), 'w', encoding = 'utf-8') as f:
+                json.dump(meta, f, ensure_ascii = False)
+
+            # Another process may have written the same snapshot meanwhile (then its snapshot is used)
+            try:
+                os.rename(tmp_path, path)
+            except OSError:
+                shutil.rmtree(tmp_path, ignore_errors = True)
+
+            self._remove_previous(snapshot.table_name, path)
+
+            return load_snapshot(path, self.fingerprint, self.skills) or snapshot
+
+        except Exception:
+            shutil.rmtree(tmp_path, ignore_errors = True)
+            return snapshot
+
+
+    # Removing the previous on-disk snapshots of the table (all timestamps and versions but the given one)
+        # The snapshots memory-mapped by the running processes stay readable until they are unmapped
+    def _remove_previous(self, table_name, keep_path):
+
+        prefix = self._disk_prefix(table_name)
+
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+
+            if not name.startswith(prefix) or path == keep_path or '.tmp' in name:
+                continue
+
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors = True)
+            else:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+    def _refresh_lock(self, table_name):
+
+        with self._lock:
+            return self._refresh_locks.setdefault(table_name, threading.Lock())
+
+
+    # Cleaned snapshot of given table, re-pulled from the source only when its timestamp advanced
+        # The outdated snapshot is served while it is being refreshed in the background (if enabled)
+    def get(self, table_name):
+
+        with self._lock:
+            snapshot = self._snapshots.get(table_name)
+            checked_at = self._checked_at.get(table_name)
+
+        # Recently checked snapshot is served without querying the source at all
+        if snapshot is not None and time.monotonic() - checked_at < self.check_interval:
+            return snapshot
+
+        # New process serves the latest on-disk snapshot right away, its source timestamp is checked in the background
+        if snapshot is None and self.background_refresh:
+            snapshot = self._read_latest_disk(table_name)
+
+            if snapshot is not None:
+                with self._lock:
+                    self._snapshots.setdefault(table_name, snapshot)
+                    self._checked_at.setdefault(table_name, float('-inf'))
+
+        if snapshot is not None and self.background_refresh:
+            self.refresh_async(table_name)
+            return snapshot
+
+        return self.refresh(table_name)
+
+
+    # Checking the source timestamp of given table and rebuilding its snapshot if it advanced
+        # The new snapshot is swapped in at once, the searches holding the previous snapshot are not affected
+    def refresh(self, table_name):
+
+        with self._refresh_lock(table_name):
+            with self._lock:
+                snapshot = self._snapshots.get(table_name)
+
+            with stage('source_timestamp'):
+                timestamp = self.source.read_timestamp(table_name, self.timestamp_col)
+
+            if snapshot is None or str(snapshot.timestamp) != str(timestamp):
+                with stage('disk_cache'):
+                    snapshot = self._read_disk(table_name, timestamp)
+
+                if snapshot is None:
+                    with stage('source_load'):
+                        raw_df = self.source.read_table(table_name, self.columns)
+                    with stage('clean'):
+                        data = self.build(raw_df)
+                    with stage('index'):
+                        index = self.build_index(data) if self.build_index else None
+                    # The cleaned data frame is not kept once the skills are indexed and the displayed columns are stored compactly
+                    if self.build_display:
+                        with stage('display'):
+                            data = self.build_display(data)
+
+                    snapshot = self._write_disk(Snapshot(table_name, timestamp, data, index))
+
+            with self._lock:
+                self._snapshots[table_name] = snapshot
+                self._checked_at[table_name] = time.monotonic()
+
+            return snapshot
+
+
+    # Refreshing the snapshot of given table in a background thread (unless its refresh is already running)
+    def refresh_async(self, table_name):
+
+        with self._lock:
+            if table_name in self._refreshing:
+                return
+            self._refreshing[table_name] = thread = threading.Thread(target = self._refresh_in_background,
+                                                                     args = (table_name,), daemon = True)
+        thread.start()
+
+
+    def _refresh_in_background(self, table_name):
+
+        start = time.perf_counter()
+
+        with self._lock:
+            previous = self._snapshots.get(table_name)
+
+        try:
+            snapshot = self.refresh(table_name)
+            # Only the swapped snapshots are logged (not the checks of the unchanged tables)
+            if snapshot is not previous:
+                log_event('snapshot_refresh', table = table_name, timestamp = str(snapshot.timestamp),
+                          duration_ms = round((time.perf_counter() - start) * 1000, 1))
+
+        # The previous snapshot is kept if the refresh fails (e.g., the source is not available), it is retried later
+        except Exception as e:
+            log_event('snapshot_refresh', table = table_name, error = repr(e),
+                      duration_ms = round((time.perf_counter() - start) * 1000, 1))
+
+        finally:
+            with self._lock:
+                self._refreshing.pop(table_name, None)
+
+
+    # Polling the source timestamps of given tables every given number of seconds in a background thread, starting right away
+        # (for the long-running servers, the Lambda functions are refreshed by the scheduled warmup event instead)
+        # The polling is started only once, the next calls are no-op
+    def start_polling(self, table_names, interval):
+
+        def poll():
+            while True:
+                for table_name in table_names:
+                    self._refresh_in_background(table_name)
+                time.sleep(interval)
+
+        with self._lock:
+            if self._poller is not None:
+                return
+            self._poller = threading.Thread(target = poll, daemon = True)
+
+        self._poller.start()
@@ -1,27 +1,51 @@
 $(document).ready(function() {
-    let displayed_rows = 0;
-    let increment = 10;
-    let rows = $("tr").not("thead tr");
-    let total_rows = rows.length;
+    // The first page is rendered by the server, the next pages are loaded on demand
+    let page = 0;
+    let displayed_rows = $("table.dataframe tbody tr").length;
+    let total_rows = $("table[data-total]").data("total");
+    // ID of the search result stored on the server
+    let search_id = $("table[data-search-id]").attr("data-search-id");
+
+    function appendRows(response) {
+        let profile = response.columns.indexOf(response.profile);
+
+        response.data.forEach(function(values) {
+            let row = $("<tr>").append($("<td>").append('<input type="checkbox" class="email-checkbox">'));
+
+            values.forEach(function(value, i) {
+                let text = value === null ? "" : String(value);
+                let cell = $("<td>");
+
+                // Only the http(s) URLs are linked (as in the server-rendered rows), e.g., not javascript: URLs
+                if (i === profile && /^https?:\/\//.test(text)) {
+                    cell.append($("<a>", {href: text, target: "_blank"}).text(text));
+                } else {
+                    cell.text(text);
+                }
+                row.append(cell);
+            });
+            $("table.dataframe tbody").append(row);
+        });
+        displayed_rows += response.data.length;
+    }
 
     function showMoreRows() {
-        for (let i = displayed_rows; i < displayed_rows + increment; i++) {
-            $(rows[i]).show();
-        }
-        displayed_rows += increment;
-
-        if (displayed_rows >= total_rows) {
-            $("#show_more").hide();
-        }
+        page += 1;
+
+        $.getJSON("/result/page", {page: page, search_id: search_id}, function(response) {
+            appendRows(response);
+
+            if (displayed_rows >= response.total || response.data.length === 0) {
+                $("#show_more").hide();
+            }
+        });
     }
 
     $("#show_more").click(showMoreRows);
 
-    // Hide all rows initially
-    rows.hide();
-
-    // Show initial 10 rows
-    showMoreRows();
+    if (displayed_rows >= total_rows) {
+        $("#show_more").hide();
+    }
 
     // Retrieve selected rows on button click
     $("#retrieve_selected").click(function() {
@@ -40,7 +64,7 @@ $(document).ready(function() {
         // Send the selected rows to the server
         $.ajax({
             type: "POST",
-            url: "/prep_email",
+            url: "/prep_email?search_id=" + encodeURIComponent(search_id),
             data: JSON.stringify(selectedRows),
             contentType: "application/json",
             success: function(response) {